@@ -0,0 +1,224 @@
+"""
+Micro-benchmarks for the Krita MCP plugin's paint commands.
+Drives KritaMCPExtension directly against the headless `krita` stand-in
+in benchmarks/headless (no Krita, no HTTP), over a grid of brush sizes,
+hardness, stroke lengths and canvas sizes, and writes the timings as JSON.
+
+    python benchmarks/bench_commands.py --output results.json
+    python benchmarks/bench_commands.py --baseline results.json --threshold 0.15
+
+With --baseline, cases whose median got slower by more than the threshold
+(and by more than --min-delta-ms) are reported and the exit status is 1.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "headless"), os.path.join(HERE, "..", "krita_plugin")]
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+# The plugin schedules refreshes with QTimer, which needs an application object
+app = QCoreApplication.instance() or QCoreApplication([])
+
+import krita  # noqa: E402
+import kritamcp  # noqa: E402
+from kritamcp import brush, workers  # noqa: E402
+
+SCHEMA_VERSION = 1
+
+# Benchmark grid - customize these as needed
+BRUSH_SIZES = (4, 16, 64)
+HARDNESS = (0.0, 0.5, 1.0)
+STROKE_LENGTHS = (100, 1000, 4000)   # Path length in pixels
+STROKE_CANVAS = 2048                 # Canvas used for the brush grid
+CANVAS_SIZES = (512, 2048, 4096)
+
+QUICK_GRID = {
+    "sizes": (16,), "hardness": (0.5,), "lengths": (1000,), "stroke_canvas": 512, "canvases": (1024,),
+}
+
+
+def stroke_points(length, canvas, margin=64, row_gap=48, step=8):
+    """A back-and-forth polyline of about `length` pixels, sampled every `step` pixels."""
+    span = canvas - 2 * margin
+    points = []
+    travelled = 0
+    row = 0
+    while True:
+        y = margin + (row * row_gap) % (canvas - 2 * margin)
+        xs = range(0, span + 1, step) if row % 2 == 0 else range(span, -1, -step)
+        for offset in xs:
+            if points:
+                px, py = points[-1]
+                travelled += math.hypot(margin + offset - px, y - py)
+            points.append([margin + offset, y])
+            if travelled >= length:
+                return points
+        row += 1
+
+
+class Case:
+    """One benchmark: a command run repeatedly on a canvas of a given size."""
+
+    def __init__(self, name, canvas, command):
+        self.name = name
+        self.canvas = canvas
+        self.command = command
+
+
+def build_cases(grid):
+    cases = []
+    size = grid["stroke_canvas"]
+    for length in grid["lengths"]:
+        points = stroke_points(length, size)
+        for radius in grid["sizes"]:
+            for hardness in grid["hardness"]:
+                cases.append(Case(
+                    f"stroke/size={radius}/hardness={hardness}/length={length}", size,
+                    {"action": "stroke", "params": {"points": points, "size": radius, "hardness": hardness}},
+                ))
+
+    for size in grid["canvases"]:
+        center = size // 2
+        cases += [
+            Case(f"clear/canvas={size}", size, {"action": "clear", "params": {"color": "#202030"}}),
+            Case(f"stroke/canvas={size}", size, {"action": "stroke", "params": {
+                "points": stroke_points(1000, size), "size": 16, "hardness": 0.5}}),
+            Case(f"fill_bucket/canvas={size}", size, {"action": "fill", "params": {
+                "x": center, "y": center, "tolerance": 32}}),
+            Case(f"fill_circle/canvas={size}", size, {"action": "fill", "params": {
+                "x": center, "y": center, "radius": size // 4}}),
+            Case(f"draw_shape_ellipse/canvas={size}", size, {"action": "draw_shape", "params": {
+                "shape": "ellipse", "x": size // 8, "y": size // 8, "width": size * 3 // 4,
+                "height": size // 2, "fill": True, "stroke": True, "line_width": 4}}),
+            Case(f"draw_shape_polygon/canvas={size}", size, {"action": "draw_shape", "params": {
+                "shape": "polygon", "points": [[size // 10, size // 10], [size * 9 // 10, size // 5],
+                                               [size // 2, size * 9 // 10]], "fill": True}}),
+            Case(f"get_canvas_preview/canvas={size}", size, {"action": "get_canvas", "params": {
+                "preview": True, "max_size": 1024, "cache": False}}),
+        ]
+    return cases
+
+
+def run_case(extension, case, repeat, warmup):
+    """Return per-run wall times in seconds; raises RuntimeError if the command fails."""
+    doc = krita.Krita.instance().activeDocument()
+    if doc.width() != case.canvas or doc.height() != case.canvas:
+        extension.run_command({"action": "new_canvas", "params": {
+            "width": case.canvas, "height": case.canvas, "background": "#1a1a2e"}})
+    extension.run_command({"action": "set_color", "params": {"color": "#ff6b6b"}})
+    extension.flush_refresh()
+
+    times = []
+    for i in range(warmup + repeat):
+        started = time.perf_counter()
+        result = extension.run_command(case.command)
+        elapsed = time.perf_counter() - started
+        if "error" in result:
+            raise RuntimeError(f"{case.name}: {result['error']}")
+        # Refreshes are left to the timer in Krita; keep them out of the timings
+        extension.flush_refresh()
+        if i >= warmup:
+            times.append(elapsed)
+    return times
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": brush.np.__version__ if brush.HAS_NUMPY else None,
+        "cpu_count": os.cpu_count(),
+        "worker_threads": workers.WORKER_THREADS,
+    }
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Return [(name, baseline median, median, ratio)] for cases that regressed."""
+    regressions = []
+    for name, entry in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        ratio = entry["median"] / before["median"] if before["median"] else math.inf
+        if ratio > 1 + threshold and entry["median"] - before["median"] > min_delta:
+            regressions.append((name, before["median"], entry["median"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (default 5)")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs per case first (default 1)")
+    parser.add_argument("--filter", action="append", default=[],
+                        help="Only run cases whose name contains this text (repeatable)")
+    parser.add_argument("--quick", action="store_true", help="Run a small grid for a fast check")
+    parser.add_argument("--list", action="store_true", help="List case names and exit")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed median slowdown as a fraction of the baseline (default 0.15)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="Ignore slowdowns smaller than this many milliseconds (default 0.5)")
+    args = parser.parse_args(argv)
+
+    grid = QUICK_GRID if args.quick else {
+        "sizes": BRUSH_SIZES, "hardness": HARDNESS, "lengths": STROKE_LENGTHS,
+        "stroke_canvas": STROKE_CANVAS, "canvases": CANVAS_SIZES,
+    }
+    cases = [case for case in build_cases(grid)
+             if not args.filter or any(text in case.name for text in args.filter)]
+    if args.list:
+        print("\n".join(case.name for case in cases))
+        return 0
+
+    extension = krita.Krita.instance().extensions[0]
+    results = {}
+    for case in cases:
+        times = run_case(extension, case, args.repeat, args.warmup)
+        results[case.name] = {
+            "canvas": case.canvas,
+            "action": case.command["action"],
+            "runs": len(times),
+            "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.fmean(times),
+        }
+        print(f"{case.name:60s} {results[case.name]['median'] * 1000:10.2f} ms", file=sys.stderr)
+
+    report = {"schema": SCHEMA_VERSION, "environment": environment(), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("environment", {}).get("numpy") != report["environment"]["numpy"]:
+        print("Warning: baseline was recorded with a different NumPy setup", file=sys.stderr)
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000)
+    for name, before, after, ratio in regressions:
+        print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({ratio:.2f}x)", file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} of {len(results)} cases regressed by more than {args.threshold:.0%}",
+              file=sys.stderr)
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} in {len(results)} cases", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Correctness checks for the Krita MCP plugin's fast raster paths.
+Compares them against slow, obviously-correct references on the headless
+`krita` stand-in in benchmarks/headless: bucket fill against a
+breadth-first search, tiled strokes against compositing every dab into one
+full-canvas region, composite() against the per-pixel blend formulas, and
+bulk sampling against direct reads. Requires NumPy.
+
+    python benchmarks/check_correctness.py
+
+Prints one line per check and exits with status 1 if any check fails.
+Run it alongside bench_commands.py after changing the raster code.
+"""
+
+import argparse
+from collections import deque
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "headless"), os.path.join(HERE, "..", "krita_plugin")]
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+# The plugin schedules refreshes with QTimer, which needs an application object
+app = QCoreApplication.instance() or QCoreApplication([])
+
+import krita  # noqa: E402
+import kritamcp  # noqa: E402
+from kritamcp import brush, compositing, fill  # noqa: E402
+
+np = brush.np
+
+COMPOSITE_TOLERANCE = 1  # Max channel difference allowed against the float64 reference
+
+
+def random_canvas(rng, width, height, noise=12, blocks=8):
+    """
+    BGRA pixels of hatching, flat random blocks and a diagonal over
+    low-contrast noise, so fills have edges to stop at, many small regions
+    and pixels that touch only at corners.
+    """
+    pixels = rng.integers(0, noise, (height, width, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    rows, columns, diagonal = rng.integers(0, 256, (3, 3), dtype=np.uint8)
+    pixels[::3, :, :3] = rows
+    pixels[:, ::5, :3] = columns  # Cuts the rows into short runs
+    for _ in range(blocks):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        w, h = rng.integers(4, width // 2), rng.integers(1, height // 3)
+        pixels[y:y + h, x:x + w, :3] = rng.integers(0, 256, 3, dtype=np.uint8)
+    # 4-connectivity must not follow a line that only touches at corners
+    for i in range(min(width, height)):
+        pixels[i, i, :3] = diagonal
+    return pixels
+
+
+def reference_fill(pixels, x, y, tolerance, contiguous):
+    """Bucket fill mask by breadth-first search over 4-connected pixels."""
+    height, width = pixels.shape[:2]
+    seed = [int(v) for v in pixels[y, x]]
+    rows = pixels.tolist()
+
+    def matches(px, py):
+        return all(abs(a - b) <= tolerance for a, b in zip(rows[py][px], seed))
+
+    mask = np.zeros((height, width), dtype=bool)
+    if not contiguous:
+        for py in range(height):
+            for px in range(width):
+                mask[py, px] = matches(px, py)
+        return mask
+
+    queue = deque([(x, y)])
+    mask[y, x] = True
+    while queue:
+        px, py = queue.popleft()
+        for nx, ny in ((px + 1, py), (px - 1, py), (px, py + 1), (px, py - 1)):
+            if 0 <= nx < width and 0 <= ny < height and not mask[ny, nx] and matches(nx, ny):
+                mask[ny, nx] = True
+                queue.append((nx, ny))
+    return mask
+
+
+def check_fill(rng):
+    failures = []
+    runs = 0
+    for tolerance in (0, 8, 24, 64):
+        for contiguous in (True, False):
+            for _ in range(4):
+                pixels = random_canvas(rng, 96, 72)
+                # Seed anywhere, on the hatching or on the diagonal
+                x, y = int(rng.integers(0, 96)), int(rng.integers(0, 72))
+                where = rng.integers(0, 3)
+                if where == 1:
+                    y -= y % 3
+                elif where == 2:
+                    x = y
+                got = fill.fill_mask(pixels, x, y, tolerance, contiguous)
+                want = reference_fill(pixels, x, y, tolerance, contiguous)
+                runs += 1
+                if not np.array_equal(got, want):
+                    failures.append(f"tolerance={tolerance} contiguous={contiguous} seed=({x}, {y}): "
+                                    f"{int((got != want).sum())} pixels differ")
+    return failures, f"{runs} fills"
+
+
+def blend_reference(mode, cb, cs):
+    if mode == "multiply":
+        return cb * cs
+    if mode == "screen":
+        return cb + cs - cb * cs
+    if mode == "overlay":
+        return 2 * cs * cb if cb <= 0.5 else 1 - 2 * (1 - cs) * (1 - cb)
+    if mode == "darken":
+        return min(cb, cs)
+    if mode == "lighten":
+        return max(cb, cs)
+    return cs
+
+
+def composite_reference(pixel, alpha, bgr, mode):
+    """Source-over of one straight-alpha BGRA pixel, from the W3C compositing formulas."""
+    if alpha <= 0:
+        return list(pixel)
+    ab = pixel[3] / 255
+    a_s = alpha
+    if mode == "erase":
+        return list(pixel[:3]) + [round(255 * ab * (1 - a_s))]
+    ao = a_s + ab * (1 - a_s)
+    out = []
+    for channel in range(3):
+        cb, cs = pixel[channel] / 255, bgr[channel] / 255
+        co = a_s * (1 - ab) * cs + a_s * ab * blend_reference(mode, cb, cs) + (1 - a_s) * ab * cb
+        out.append(round(255 * co / ao))
+    return out + [round(255 * ao)]
+
+
+def check_compositing(rng):
+    failures = []
+    size = 48
+    for mode in compositing.BLEND_MODES:
+        for opacity in (1.0, 0.6, 0.05):
+            pixels = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+            pixels[:8, :, 3] = 0      # Transparent backdrop
+            pixels[8:16, :, 3] = 255  # Opaque backdrop
+            alpha = rng.integers(0, 256, (size, size), dtype=np.uint8)
+            alpha[:, :6] = 0
+            alpha[:, 6:12] = 255
+            bgr = tuple(int(v) for v in rng.integers(0, 256, 3))
+
+            got = pixels.copy()
+            compositing.composite(got, alpha, 0, 0, bgr, mode, opacity)
+            worst = 0
+            for y in range(size):
+                for x in range(size):
+                    want = composite_reference(pixels[y, x].tolist(), alpha[y, x] / 255 * opacity, bgr, mode)
+                    got_pixel = got[y, x].tolist()
+                    if got_pixel[3] == 0 and want[3] == 0:
+                        continue  # Color is meaningless without coverage
+                    worst = max(worst, max(abs(a - b) for a, b in zip(got_pixel, want)))
+            if worst > COMPOSITE_TOLERANCE:
+                failures.append(f"mode={mode} opacity={opacity}: off by up to {worst}")
+
+        # A fully opaque normal dab takes the overwrite fast path
+        pixels = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+        compositing.composite(pixels, np.full((size, size), 255, np.uint8), 0, 0, (1, 2, 3), "normal")
+        if not (pixels == (1, 2, 3, 255)).all():
+            failures.append("opaque normal composite did not overwrite")
+    return failures, f"{len(compositing.BLEND_MODES)} blend modes"
+
+
+def check_stroke(extension, rng):
+    failures = []
+    size = 1024
+    extension.run_command({"action": "new_canvas", "params": {"width": size, "height": size}})
+    extension.run_command({"action": "set_color", "params": {"color": "#3366cc"}})
+    doc = krita.Krita.instance().activeDocument()
+    layer = doc.activeNode()
+
+    cases = 0
+    for hardness in (0.0, 0.7, 1.0):
+        for mode in ("normal", "multiply", "erase"):
+            backdrop = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+            layer.setPixelData(backdrop.tobytes(), 0, 0, size, size)
+
+            t = np.linspace(0, 1, 400)
+            points = np.stack([80 + 860 * t, 512 + 380 * np.sin(t * 9), t], axis=1).round(2).tolist()
+            params = {"points": points, "size": 24, "hardness": hardness, "opacity": 0.8, "blend_mode": mode}
+            result = extension.run_command({"action": "stroke", "params": params})
+            if "error" in result:
+                failures.append(f"hardness={hardness} mode={mode}: {result['error']}")
+                continue
+            got = brush.pixel_array(layer.pixelData(0, 0, size, size), size, size)
+
+            # Reference: every dab composited in order into one canvas-sized region
+            want = backdrop.copy()
+            pts = np.asarray(points)
+            for x, y, radius, opacity in zip(*brush.stroke_dabs(pts, pts[:, 2], 12, 0.8)):
+                alpha, left, top = brush.stamp_cache.dab(x, y, radius, hardness)
+                compositing.composite(want, alpha, left, top, (0xcc, 0x66, 0x33), mode, opacity)
+            cases += 1
+            if not np.array_equal(got, want):
+                failures.append(f"hardness={hardness} mode={mode}: "
+                                f"{int((got != want).any(axis=2).sum())} pixels differ from the single-region stroke")
+    return failures, f"{cases} strokes"
+
+
+def check_sampling(extension, rng):
+    failures = []
+    width, height = 300, 200
+    extension.run_command({"action": "new_canvas", "params": {"width": width, "height": height}})
+    doc = krita.Krita.instance().activeDocument()
+    pixels = random_canvas(rng, width, height)
+    doc.activeNode().setPixelData(pixels.tobytes(), 0, 0, width, height)
+    doc.refreshProjection()
+
+    points = [[int(rng.integers(0, width)), int(rng.integers(0, height))] for _ in range(200)]
+    result = extension.run_command({"action": "sample", "params": {"points": points, "rect": [10, 20, 120, 90]}})
+    if "error" in result:
+        return [result["error"]], ""
+    for (x, y), color in zip(points, result["colors"]):
+        b, g, r, a = pixels[y, x].tolist()
+        if (color["r"], color["g"], color["b"], color["a"]) != (r, g, b, a):
+            failures.append(f"point ({x}, {y}): got {color['color']}")
+            break
+    mean = pixels[20:110, 10:130].reshape(-1, 4).mean(axis=0)
+    stats = result["stats"]["mean"]
+    if (stats["r"], stats["g"], stats["b"]) != tuple(int(v) for v in np.rint(mean[[2, 1, 0]])):
+        failures.append(f"region mean {stats['color']} does not match")
+
+    single = extension.run_command({"action": "get_color_at", "params": {"x": points[0][0], "y": points[0][1]}})
+    if single.get("color") != result["colors"][0]["color"]:
+        failures.append(f"get_color_at disagrees with sample: {single}")
+    return failures, f"{len(points)} points"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (default: random, printed)")
+    args = parser.parse_args(argv)
+
+    if not brush.HAS_NUMPY:
+        print("These checks require NumPy", file=sys.stderr)
+        return 1
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    rng = np.random.default_rng(seed)
+    print(f"seed {seed}")
+
+    extension = krita.Krita.instance().extensions[0]
+    checks = [
+        ("fill", lambda: check_fill(rng)),
+        ("compositing", lambda: check_compositing(rng)),
+        ("stroke", lambda: check_stroke(extension, rng)),
+        ("sampling", lambda: check_sampling(extension, rng)),
+    ]
+    failed = 0
+    for name, run in checks:
+        failures, summary = run()
+        if failures:
+            failed += 1
+            print(f"FAIL {name}")
+            for failure in failures:
+                print(f"    {failure}")
+        else:
+            print(f"ok   {name} ({summary})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
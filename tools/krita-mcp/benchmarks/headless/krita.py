@@ -0,0 +1,264 @@
+"""
+Headless stand-in for Krita's `krita` Python module.
+Implements the slice of the scripting API the MCP plugin uses (Krita,
+Document, Node, View, Window, ManagedColor, InfoObject, Extension) on
+in-memory BGRA U8 buffers, so KritaMCPExtension can be imported and driven
+without a Krita GUI. Put this directory on sys.path before importing
+kritamcp. Only PyQt5 is required; NumPy speeds up the projection.
+
+Layers are composited source-over into the projection on
+refreshProjection(), like Krita's merged image. Undo/redo, brush presets
+and the GUI are no-ops.
+"""
+
+from PyQt5.QtCore import QByteArray, QObject, QUuid
+from PyQt5.QtGui import QColor
+
+try:
+    import numpy as np
+except ImportError:  # The plugin's pure-Python paths work without it
+    np = None
+
+PROJECTION_BAND_ROWS = 256  # Rows composited at a time on refreshProjection()
+
+
+class Extension(QObject):
+    def __init__(self, parent=None):
+        super().__init__()
+
+    def setup(self):
+        pass
+
+    def createActions(self, window):
+        pass
+
+
+class InfoObject:
+    pass
+
+
+class ManagedColor:
+    def __init__(self, color):
+        self.color = QColor(color)
+
+    @staticmethod
+    def fromQColor(color, canvas=None):
+        return ManagedColor(color)
+
+    def colorForCanvas(self, canvas):
+        return QColor(self.color)
+
+
+class Node:
+    """A paint layer (or the root group) backed by a width * height * 4 bytearray."""
+
+    def __init__(self, document, name="layer", node_type="paintlayer"):
+        self.document = document
+        self.node_name = name
+        self.node_type = node_type
+        self.uuid = QUuid.createUuid()
+        self.children = []
+        self.pixels = bytearray(document.width() * document.height() * 4)
+
+    def name(self):
+        return self.node_name
+
+    def type(self):
+        return self.node_type
+
+    def uniqueId(self):
+        return self.uuid
+
+    def childNodes(self):
+        return list(self.children)
+
+    def addChildNode(self, child, above):
+        index = self.children.index(above) + 1 if above in self.children else len(self.children)
+        self.children.insert(index, child)
+        self.document.active = child
+        return True
+
+    def _rows(self, x, y, w, h):
+        # Yield (buffer offset, data offset, length) for the part of each row inside the canvas
+        width, height = self.document.width(), self.document.height()
+        x0, x1 = max(0, x), min(width, x + w)
+        if x0 >= x1:
+            return
+        for row in range(max(0, y), min(height, y + h)):
+            yield (row * width + x0) * 4, ((row - y) * w + x0 - x) * 4, (x1 - x0) * 4
+
+    def pixelData(self, x, y, w, h):
+        """Return w * h BGRA bytes as a QByteArray, like Krita; pixels outside the canvas are transparent."""
+        out = bytearray(w * h * 4)
+        for src, dst, length in self._rows(x, y, w, h):
+            out[dst:dst + length] = self.pixels[src:src + length]
+        return QByteArray(bytes(out))
+
+    def setPixelData(self, data, x, y, w, h):
+        data = memoryview(data).cast("B")
+        if len(data) != w * h * 4:
+            raise ValueError(f"setPixelData got {len(data)} bytes for {w}x{h}")
+        for dst, src, length in self._rows(x, y, w, h):
+            self.pixels[dst:dst + length] = data[src:src + length]
+        return True
+
+    def projectionPixelData(self, x, y, w, h):
+        if self.children:
+            # Group nodes (the root) read back the last refreshed projection
+            return self.document.projection.pixelData(x, y, w, h)
+        return self.pixelData(x, y, w, h)
+
+
+class Document:
+    def __init__(self, width, height, name="Untitled", color_model="RGBA", color_depth="U8"):
+        self.w, self.h = width, height
+        self.doc_name = name
+        self.color_model, self.color_depth = color_model, color_depth
+        self.root = Node(self, "root", "grouplayer")
+        self.projection = Node(self, "projection")
+        self.active = None
+        self.root.addChildNode(Node(self, "Background"), None)
+        self.refreshes = 0
+
+    def name(self):
+        return self.doc_name
+
+    def width(self):
+        return self.w
+
+    def height(self):
+        return self.h
+
+    def colorModel(self):
+        return self.color_model
+
+    def colorDepth(self):
+        return self.color_depth
+
+    def rootNode(self):
+        return self.root
+
+    def activeNode(self):
+        return self.active
+
+    def setActiveNode(self, node):
+        self.active = node
+
+    def createNode(self, name, node_type):
+        return Node(self, name, node_type)
+
+    def refreshProjection(self):
+        """Composite the layers bottom to top (straight-alpha source-over)."""
+        self.refreshes += 1
+        layers = self.root.children
+        if np is None or len(layers) == 1:
+            self.projection.pixels[:] = layers[-1].pixels
+            return
+        stride = self.w * 4
+        for y0 in range(0, self.h, PROJECTION_BAND_ROWS):
+            y1 = min(self.h, y0 + PROJECTION_BAND_ROWS)
+            out = np.zeros((y1 - y0, self.w, 4), dtype=np.float32)
+            for layer in layers:
+                band = np.frombuffer(layer.pixels, dtype=np.uint8, count=(y1 - y0) * stride, offset=y0 * stride)
+                src = band.reshape(y1 - y0, self.w, 4) / np.float32(255)
+                src_a = src[..., 3:]
+                out_a = src_a + out[..., 3:] * (1 - src_a)
+                color = src[..., :3] * src_a + out[..., :3] * out[..., 3:] * (1 - src_a)
+                out[..., :3] = np.divide(color, out_a, out=np.zeros_like(color), where=out_a > 0)
+                out[..., 3:] = out_a
+            self.projection.pixels[y0 * stride:y1 * stride] = np.rint(out * 255).astype(np.uint8).tobytes()
+
+    def exportImage(self, path, info):
+        with open(path, "wb") as f:
+            f.write(self.projection.pixels)
+        return True
+
+
+class Canvas:
+    pass
+
+
+class View:
+    def __init__(self):
+        self.foreground = ManagedColor(QColor("#ffffff"))
+        self.brush_size = 20
+        self.preset = None
+        self.view_canvas = Canvas()
+
+    def canvas(self):
+        return self.view_canvas
+
+    def foregroundColor(self):
+        return self.foreground
+
+    def setForeGroundColor(self, color):
+        self.foreground = color
+
+    def setBrushSize(self, size):
+        self.brush_size = size
+
+    def setCurrentBrushPreset(self, preset):
+        self.preset = preset
+
+
+class Window:
+    def __init__(self):
+        self.view = View()
+
+    def activeView(self):
+        return self.view
+
+    def addView(self, document):
+        return self.view
+
+
+class Resource:
+    def __init__(self, name):
+        self.resource_name = name
+
+    def name(self):
+        return self.resource_name
+
+
+class Action:
+    def __init__(self, name):
+        self.action_name = name
+
+    def trigger(self):
+        pass
+
+
+class Krita:
+    _instance = None
+
+    def __init__(self):
+        self.document = Document(800, 600)
+        self.window = Window()
+        self.extensions = []
+        self.presets = {name: Resource(name) for name in ("Basic-1", "Basic-5 Size", "Airbrush Soft", "Ink-2 Fineliner")}
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = Krita()
+        return cls._instance
+
+    def activeDocument(self):
+        return self.document
+
+    def activeWindow(self):
+        return self.window
+
+    def addExtension(self, extension):
+        self.extensions.append(extension)
+
+    def createDocument(self, width, height, name, color_model, color_depth, profile, resolution):
+        # Pixel buffers stay BGRA U8 whatever the color space; only the names are kept
+        self.document = Document(width, height, name, color_model, color_depth)
+        return self.document
+
+    def resources(self, kind):
+        return dict(self.presets) if kind == "preset" else {}
+
+    def action(self, name):
+        return Action(name)
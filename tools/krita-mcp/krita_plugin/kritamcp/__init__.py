@@ -4,70 +4,122 @@ Allows Claude (or any MCP client) to paint by sending commands to this plugin.
 """
 
 from krita import *
-from PyQt5.QtCore import QTimer, QThread, pyqtSignal, QPointF, QRectF
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, QPointF, QRectF
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QMessageBox
+import base64
 import json
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import os
+import time
+
+try:
+    import numpy as np
+except ImportError:  # Krita's bundled Python does not always ship NumPy
+    np = None
+
+from . import brush, compositing, curves, export, fill, metrics, presets, sampling, shapes, tiles, tracking, wire, workers
 
 # Configuration - customize these as needed
 SERVER_PORT = 5678
 CANVAS_OUTPUT_DIR = os.path.expanduser("~/krita-mcp-output")
+FRAME_BUDGET_MS = 8  # Max main-thread time spent draining commands per wakeup
+REFRESH_INTERVAL_MS = 16  # Painted areas are refreshed at most once per interval
+COMMAND_TIMEOUT = 10  # Default seconds to wait for a command; requests may send "timeout"
+MAX_COMMAND_TIMEOUT = 300
+
+COMMANDS = (
+    "new_canvas", "set_color", "set_brush", "stroke",
+    "fill", "draw_shape", "get_canvas", "undo", "redo",
+    "clear", "save", "get_color_at", "list_brushes", "batch",
+    "get_canvas_diff", "sample", "curve_stroke"
+)
+
+
+def action_label(command):
+    """Metrics label for a command's action; unknown actions share one label."""
+    action = command.get("action")
+    return action if action in COMMANDS else "unknown"
 
 class CommandQueue:
     """Thread-safe command queue for passing commands from HTTP thread to main thread."""
     def __init__(self):
-        self.queue = []
-        self.results = {}
+        self.queue = deque()
         self.lock = threading.Lock()
-        self.result_event = threading.Event()
+        self.on_push = None  # Called after every push to wake the main thread
 
-    def push(self, command_id, command):
+    def __len__(self):
         with self.lock:
-            self.queue.append((command_id, command))
+            return len(self.queue)
 
-    def pop(self):
+    def push(self, command_id, command):
+        """Queue a command and return a Future that resolves to its result."""
+        future = Future()
         with self.lock:
-            if self.queue:
-                return self.queue.pop(0)
-            return None
+            self.queue.append((command_id, command, future, time.perf_counter()))
+        if self.on_push:
+            self.on_push()
+        return future
 
-    def set_result(self, command_id, result):
+    def pop(self):
+        """
+        Return the next (command_id, command, future, queued_at) whose waiter
+        hasn't given up; queued_at is a time.perf_counter() value.
+        """
         with self.lock:
-            self.results[command_id] = result
-        self.result_event.set()
+            while self.queue:
+                item = self.queue.popleft()
+                if item[2].set_running_or_notify_cancel():
+                    return item
+        return None
 
-    def get_result(self, command_id, timeout=10):
+    def get_result(self, future, timeout=COMMAND_TIMEOUT, action="unknown"):
         """Wait for result with timeout."""
-        start = threading.Event()
-        for _ in range(int(timeout * 10)):  # Check every 100ms
-            with self.lock:
-                if command_id in self.results:
-                    result = self.results.pop(command_id)
-                    return result
-            self.result_event.wait(0.1)
-            self.result_event.clear()
-        return {"error": "Timeout waiting for command execution"}
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Commands still queued are dropped so they don't run after the client left
+            future.cancel()
+            metrics.registry.count_timeout(action)
+            return {"error": "Timeout waiting for command execution"}
 
 # Global command queue
 command_queue = CommandQueue()
 command_counter = 0
+command_counter_lock = threading.Lock()
+
+
+def next_command_id():
+    """Return a unique command ID (requests are handled on many threads)."""
+    global command_counter
+    with command_counter_lock:
+        command_counter += 1
+        return command_counter
+
 
 class PaintRequestHandler(BaseHTTPRequestHandler):
     """HTTP request handler for paint commands."""
 
+    # HTTP/1.1 keeps client connections open between commands
+    protocol_version = "HTTP/1.1"
+    timeout = 60  # Close idle keep-alive connections after this many seconds
+    disable_nagle_algorithm = True  # Headers and body are separate small writes
+
     def log_message(self, format, *args):
         # Suppress HTTP logging
         pass
 
     def send_json_response(self, data, status=200):
+        body = json.dumps(data).encode()
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
 
     def do_GET(self):
         """Handle GET requests - mainly for health check."""
@@ -75,39 +127,100 @@ class PaintRequestHandler(BaseHTTPRequestHandler):
 
         if parsed.path == '/health':
             self.send_json_response({"status": "ok", "plugin": "kritamcp"})
+        elif parsed.path.startswith('/export/'):
+            self.send_export_status(parsed)
+        elif parsed.path == '/metrics':
+            self.send_metrics()
+        elif parsed.path == '/stats':
+            self.send_json_response({
+                "status": "ok",
+                "uptime": round(time.time() - metrics.registry.started, 1),
+                "queue_depth": len(command_queue),
+                "actions": metrics.registry.summary(),
+                "stamp_cache": brush.stamp_cache.stats()
+            })
         elif parsed.path == '/info':
             self.send_json_response({
                 "status": "ok",
                 "canvas_dir": CANVAS_OUTPUT_DIR,
-                "commands": [
-                    "new_canvas", "set_color", "set_brush", "stroke",
-                    "fill", "draw_shape", "get_canvas", "undo", "redo",
-                    "clear", "save", "get_color_at", "list_brushes"
-                ]
+                "commands": list(COMMANDS),
+                # Request body formats accepted besides application/json
+                "content_types": [wire.POINTS_CONTENT_TYPE] if brush.HAS_NUMPY else [],
+                "binary_point_actions": list(wire.ARRAY_ACTIONS),
+                "stamp_cache": brush.stamp_cache.stats()
             })
         else:
             self.send_json_response({"error": "Unknown endpoint"}, 404)
 
+    def send_metrics(self):
+        """GET /metrics: counters and latency histograms in the Prometheus text format."""
+        body = metrics.registry.prometheus([
+            ("kritamcp_queue_depth", "Commands waiting for the main thread.", len(command_queue)),
+        ]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', metrics.PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_export_status(self, parsed):
+        """GET /export/<job>[?wait=seconds]: report (or wait for) a background export."""
+        try:
+            job = int(parsed.path[len('/export/'):])
+            wait = min(float(parse_qs(parsed.query).get('wait', ['0'])[0]), MAX_COMMAND_TIMEOUT)
+        except ValueError:
+            self.send_json_response({"error": "Invalid export job request"}, 400)
+            return
+
+        # Waiting happens on this HTTP thread, never on Krita's main thread
+        if wait > 0:
+            info = export.export_jobs.wait(job, wait)
+        else:
+            info = export.export_jobs.status(job)
+
+        if info is None:
+            self.send_json_response({"error": f"Unknown export job: {job}"}, 404)
+        else:
+            self.send_json_response(dict(info, status="ok"))
+
     def do_POST(self):
         """Handle POST requests - paint commands."""
-        global command_counter
-
         content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode('utf-8')
+        body = self.rfile.read(content_length)
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+
+        if content_type == wire.POINTS_CONTENT_TYPE:
+            if not brush.HAS_NUMPY:
+                self.send_json_response({"error": "Binary payloads require NumPy in Krita's Python"}, 415)
+                return
+            try:
+                command = wire.decode_points_command(body)
+            except ValueError as e:
+                self.send_json_response({"error": f"Invalid binary payload: {e}"}, 400)
+                return
+        else:
+            try:
+                command = json.loads(body.decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                self.send_json_response({"error": "Invalid JSON"}, 400)
+                return
+
+        if not isinstance(command, dict):
+            self.send_json_response({"error": "Command must be a JSON object"}, 400)
+            return
 
         try:
-            command = json.loads(body)
-        except json.JSONDecodeError:
-            self.send_json_response({"error": "Invalid JSON"}, 400)
+            timeout = min(float(command.get("timeout", COMMAND_TIMEOUT)), MAX_COMMAND_TIMEOUT)
+        except (TypeError, ValueError):
+            self.send_json_response({"error": "Invalid timeout"}, 400)
             return
 
         # Assign command ID and queue it
-        command_counter += 1
-        command_id = command_counter
-        command_queue.push(command_id, command)
+        command_id = next_command_id()
+        future = command_queue.push(command_id, command)
 
         # Wait for result from main thread
-        result = command_queue.get_result(command_id)
+        result = command_queue.get_result(future, timeout, action_label(command))
 
         if "error" in result:
             self.send_json_response(result, 500)
@@ -124,23 +237,37 @@ class ServerThread(QThread):
         self.server = None
 
     def run(self):
-        self.server = HTTPServer(('localhost', self.port), PaintRequestHandler)
+        # One thread per connection, so a slow command doesn't block /health
+        self.server = ThreadingHTTPServer(('localhost', self.port), PaintRequestHandler)
+        self.server.daemon_threads = True
         self.server.serve_forever()
 
     def stop(self):
         if self.server:
             self.server.shutdown()
+            self.server.server_close()
 
 
 class KritaMCPExtension(Extension):
     """Main Krita extension class."""
 
+    # Emitted from the HTTP thread; delivered to the main thread via the event loop
+    commands_queued = pyqtSignal()
+
     def __init__(self, parent):
         super().__init__(parent)
         self.server_thread = None
-        self.timer = None
+        self.frame_budget = FRAME_BUDGET_MS / 1000.0
         self.current_brush_size = 20
         self.current_opacity = 1.0
+        self.dirty_doc = None  # Document painted since the last projection refresh
+        self.refresh_scheduled = False
+        self.current_action = None  # Metrics label for refresh/encode time; None between commands
+        self.changes = tracking.ChangeTracker()
+        self.preset_index = presets.PresetIndex(lambda: Krita.instance().resources("preset"))
+
+        self.commands_queued.connect(self.process_commands, Qt.QueuedConnection)
+        command_queue.on_push = self.commands_queued.emit
 
     def setup(self):
         """Called when extension is loaded."""
@@ -157,21 +284,52 @@ class KritaMCPExtension(Extension):
             self.server_thread.start()
             print(f"[KritaMCP] HTTP server started on port {SERVER_PORT}")
 
-        # Start timer to process command queue
-        if self.timer is None:
-            self.timer = QTimer()
-            self.timer.timeout.connect(self.process_commands)
-            self.timer.start(50)  # Check every 50ms
-
     def process_commands(self):
-        """Process commands from queue in main thread."""
-        item = command_queue.pop()
-        if item is None:
-            return
-
-        command_id, command = item
-        result = self.execute_command(command)
-        command_queue.set_result(command_id, result)
+        """Drain queued commands in the main thread until the frame budget runs out."""
+        deadline = time.perf_counter() + self.frame_budget
+
+        while True:
+            item = command_queue.pop()
+            if item is None:
+                return
+
+            command_id, command, future, queued_at = item
+            metrics.registry.observe("queue_wait", action_label(command), time.perf_counter() - queued_at)
+            try:
+                result = self.run_command(command)
+            except Exception as e:
+                # An exception escaping this Qt slot would abort Krita and strand the queue
+                result = {"error": str(e)}
+            future.set_result(result)
+
+            if time.perf_counter() >= deadline:
+                break
+
+        # Out of budget with work left: let the UI repaint, then continue
+        if len(command_queue):
+            QTimer.singleShot(0, self.process_commands)
+
+    def run_command(self, command):
+        """Execute a command, honoring a per-request immediate refresh."""
+        action = action_label(command)
+        params = command.get("params", {})
+        if not isinstance(params, dict):
+            result = {"error": "params must be a JSON object"}
+            metrics.registry.count_command(action, result)
+            return result
+
+        # Batches run their commands through here too, so restore the outer label
+        outer_action, self.current_action = self.current_action, action
+        try:
+            with metrics.registry.timed("execute", action):
+                result = self.execute_command(command)
+            if params.get("refresh"):
+                # Caller asked to see the result on screen right away
+                self.flush_refresh()
+        finally:
+            self.current_action = outer_action
+        metrics.registry.count_command(action, result)
+        return result
 
     def execute_command(self, command):
         """Execute a paint command and return result."""
@@ -187,6 +345,8 @@ class KritaMCPExtension(Extension):
                 return self.cmd_set_brush(params)
             elif action == "stroke":
                 return self.cmd_stroke(params)
+            elif action == "curve_stroke":
+                return self.cmd_curve_stroke(params)
             elif action == "fill":
                 return self.cmd_fill(params)
             elif action == "draw_shape":
@@ -205,6 +365,12 @@ class KritaMCPExtension(Extension):
                 return self.cmd_get_color_at(params)
             elif action == "list_brushes":
                 return self.cmd_list_brushes(params)
+            elif action == "batch":
+                return self.cmd_batch(params)
+            elif action == "get_canvas_diff":
+                return self.cmd_get_canvas_diff(params)
+            elif action == "sample":
+                return self.cmd_sample(params)
             else:
                 return {"error": f"Unknown action: {action}"}
 
@@ -224,6 +390,14 @@ class KritaMCPExtension(Extension):
             return window.activeView()
         return None
 
+    def check_blend_mode(self, blend_mode):
+        """Return an error response for an unusable blend mode, or None."""
+        if blend_mode not in compositing.BLEND_MODES:
+            return {"error": f"Unknown blend mode: {blend_mode} (use one of {', '.join(compositing.BLEND_MODES)})"}
+        if blend_mode != "normal" and not brush.HAS_NUMPY:
+            return {"error": "Blend modes other than normal require NumPy in Krita's Python"}
+        return None
+
     def get_active_layer(self):
         """Get active paint layer."""
         doc = self.get_active_document()
@@ -231,6 +405,38 @@ class KritaMCPExtension(Extension):
             return doc.activeNode()
         return None
 
+    def mark_dirty(self, doc, x=0, y=0, width=None, height=None):
+        """
+        Record a painted rectangle for change tracking and schedule a
+        projection refresh. Krita's API only refreshes whole documents, so
+        refreshes are coalesced to one per frame rather than limited to the rect.
+        """
+        key = tracking.document_key(doc)
+        if width is None:
+            self.changes.mark_all(key)
+        else:
+            self.changes.mark(key, x, y, width, height)
+
+        if self.dirty_doc is not None and self.dirty_doc != doc:
+            self.flush_refresh()
+        self.dirty_doc = doc
+
+        if not self.refresh_scheduled:
+            self.refresh_scheduled = True
+            QTimer.singleShot(REFRESH_INTERVAL_MS, self.flush_refresh)
+
+    def flush_refresh(self):
+        """Apply any pending projection refresh (call before reading pixels back)."""
+        self.refresh_scheduled = False
+        doc = self.dirty_doc
+        if doc is None:
+            return
+
+        self.dirty_doc = None
+        # Timer-driven refreshes happen between commands
+        with metrics.registry.timed("refresh", self.current_action or "scheduled"):
+            doc.refreshProjection()
+
     def cmd_new_canvas(self, params):
         """Create a new canvas."""
         width = params.get("width", 800)
@@ -256,11 +462,10 @@ class KritaMCPExtension(Extension):
         color = QColor(bg_color)
         r, g, b = color.red(), color.green(), color.blue()
 
-        # Create pixel data for entire canvas (BGRA format)
-        pixel_data = bytes([b, g, r, 255] * (width * height))
-        layer.setPixelData(pixel_data, 0, 0, width, height)
+        # Written in tiles so memory use doesn't grow with the canvas size
+        tiles.fill_solid(layer, 0, 0, width, height, (b, g, r, 255))
 
-        doc.refreshProjection()
+        self.mark_dirty(doc)
 
         return {"status": "ok", "width": width, "height": height, "name": name}
 
@@ -289,15 +494,11 @@ class KritaMCPExtension(Extension):
             return {"error": "No active view"}
 
         if preset_name:
-            # Find brush preset
-            presets = Krita.instance().resources("preset")
-            found = None
-            for name, preset in presets.items():
-                if preset_name.lower() in name.lower():
-                    found = preset
-                    break
+            # Find brush preset: exact, then prefix, then substring, then fuzzy
+            name, found = self.preset_index.best_match(preset_name)
             if found:
                 view.setCurrentBrushPreset(found)
+                preset_name = name
             else:
                 return {"error": f"Brush preset not found: {preset_name}"}
 
@@ -317,9 +518,38 @@ class KritaMCPExtension(Extension):
         brush_size = params.get("size", self.current_brush_size)
         hardness = params.get("hardness", 0.5)  # 0.0 = very soft, 1.0 = hard edge
         opacity = params.get("opacity", 1.0)
+        blend_mode = params.get("blend_mode", "normal")
+        # Pressure: one value, one value per point, or a third [x, y, p] coordinate
+        pressure = params.get("pressure", 1.0)
+        size_curve = params.get("size_curve")        # [[pressure, size factor], ...]
+        opacity_curve = params.get("opacity_curve")  # [[pressure, opacity factor], ...]
 
         if len(points) < 2:
             return {"error": "Need at least 2 points for a stroke"}
+        error = self.check_blend_mode(blend_mode)
+        if error:
+            return error
+
+        if brush.HAS_NUMPY:
+            # Points may arrive as arrays from the binary wire format
+            coords = np.asarray(points, dtype=float)
+            if coords.ndim != 2 or coords.shape[1] < 2:
+                return {"error": "Points must be [x, y] or [x, y, pressure]"}
+            if not isinstance(pressure, (int, float)):
+                pressures = np.asarray(pressure, dtype=float)
+            elif coords.shape[1] > 2:
+                pressures = coords[:, 2]
+            else:
+                pressures = np.full(len(coords), float(pressure))
+            if pressures.shape != (len(coords),):
+                return {"error": "Need one pressure value per point"}
+            points, pressures = coords, np.clip(pressures, 0.0, 1.0)
+        elif isinstance(pressure, (list, tuple)):
+            if len(pressure) != len(points):
+                return {"error": "Need one pressure value per point"}
+            pressures = [min(1.0, max(0.0, p)) for p in pressure]
+        else:
+            pressures = [min(1.0, max(0.0, p[2] if len(p) > 2 else pressure)) for p in points]
 
         layer = self.get_active_layer()
         if not layer:
@@ -338,13 +568,24 @@ class KritaMCPExtension(Extension):
 
         width = doc.width()
         height = doc.height()
-        radius = max(1, brush_size // 2)
+        base_radius = max(1, brush_size // 2)
 
-        # Calculate bounding box for all points plus brush radius
-        min_x = max(0, int(min(p[0] for p in points)) - radius - 2)
-        min_y = max(0, int(min(p[1] for p in points)) - radius - 2)
-        max_x = min(width, int(max(p[0] for p in points)) + radius + 2)
-        max_y = min(height, int(max(p[1] for p in points)) + radius + 2)
+        dabs = list(zip(*brush.stroke_dabs(points, pressures, base_radius, opacity, size_curve, opacity_curve)))
+
+        if brush.HAS_NUMPY:
+            painted = self.paint_dabs(doc, layer, dabs, hardness, (b, g, r), blend_mode)
+            if not painted:
+                return {"error": "Stroke out of bounds"}
+            return {
+                "status": "ok", "points_count": len(points), "dabs": len(dabs),
+                "tiles": painted, "hardness": hardness
+            }
+
+        # Calculate bounding box for all dabs
+        min_x = max(0, min(int(x) - radius for x, y, radius, _ in dabs) - 2)
+        min_y = max(0, min(int(y) - radius for x, y, radius, _ in dabs) - 2)
+        max_x = min(width, max(int(x) + radius for x, y, radius, _ in dabs) + 2)
+        max_y = min(height, max(int(y) + radius for x, y, radius, _ in dabs) + 2)
 
         w = max_x - min_x
         h = max_y - min_y
@@ -354,11 +595,12 @@ class KritaMCPExtension(Extension):
 
         # Get existing pixel data for the affected region
         existing = layer.pixelData(min_x, min_y, w, h)
-        pixels = bytearray(existing)
 
         import math
 
-        def draw_soft_circle(cx, cy, point_opacity=1.0):
+        pixels = bytearray(existing)
+
+        def draw_soft_circle(cx, cy, radius, dab_opacity):
             """Draw a soft circle with falloff at canvas coordinates."""
             for dy in range(-radius, radius + 1):
                 for dx in range(-radius, radius + 1):
@@ -383,7 +625,7 @@ class KritaMCPExtension(Extension):
                                     falloff = (dist - hardness) / (1.0 - hardness) if hardness < 1.0 else 0
                                     alpha_factor = 1.0 - falloff
 
-                            final_alpha = int(255 * alpha_factor * opacity * point_opacity)
+                            final_alpha = int(255 * alpha_factor * dab_opacity)
 
                             if final_alpha > 0:
                                 idx = (py * w + px) * 4
@@ -405,34 +647,162 @@ class KritaMCPExtension(Extension):
                                 pixels[idx+2] = new_r
                                 pixels[idx+3] = new_a
 
-        def draw_line(x1, y1, x2, y2):
-            """Draw a line using interpolation with soft brush circles."""
-            dist = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-            # More steps for smoother lines
-            steps = max(1, int(dist / max(1, radius / 3)))
-
-            for i in range(steps + 1):
-                t = i / steps if steps > 0 else 0
-                x = x1 + t * (x2 - x1)
-                y = y1 + t * (y2 - y1)
-                draw_soft_circle(x, y)
-
-        # Draw soft circles at each point and lines between them
-        for i in range(len(points)):
-            draw_soft_circle(points[i][0], points[i][1])
-            if i > 0:
-                draw_line(points[i-1][0], points[i-1][1], points[i][0], points[i][1])
+        # Dabs are spaced along the path, not stamped at every input point
+        for x, y, radius, dab_opacity in dabs:
+            draw_soft_circle(x, y, radius, dab_opacity)
 
         layer.setPixelData(bytes(pixels), min_x, min_y, w, h)
-        doc.refreshProjection()
+        self.mark_dirty(doc, min_x, min_y, w, h)
+
+        return {"status": "ok", "points_count": len(points), "dabs": len(dabs), "hardness": hardness}
+
+    def paint_dabs(self, doc, layer, dabs, hardness, bgr, blend_mode):
+        """
+        Composite (x, y, radius, opacity) dabs into a layer tile by tile.
+
+        Only tiles the dabs overlap are read and written back, each with the
+        dabs that touch it in stroke order. Returns the number of tiles.
+        """
+        boxes = []
+        for x, y, radius, _ in dabs:
+            left, top, _, _ = brush.stamp_cache.place(x, y, radius)
+            boxes.append((left, top, left + 2 * radius + 2, top + 2 * radius + 2))
+
+        # Big strokes stay tiled so the tiles can be blended in parallel
+        grouped = tiles.group_by_tile(boxes, doc.width(), doc.height(), merge_below=workers.PARALLEL_MIN_PIXELS)
+        members = dict(grouped)
+
+        def read(rect):
+            tx, ty, tw, th = rect
+            return brush.pixel_array(layer.pixelData(tx, ty, tw, th), tw, th)
+
+        def blend(rect, pixels):
+            tx, ty = rect[0], rect[1]
+            for i in members[rect]:
+                x, y, radius, dab_opacity = dabs[i]
+                alpha, left, top = brush.stamp_cache.dab(x, y, radius, hardness)
+                compositing.composite(pixels, alpha, left - tx, top - ty, bgr, blend_mode, dab_opacity)
+            return pixels
+
+        def write(rect, pixels):
+            layer.setPixelData(pixels.tobytes(), *rect)
+            self.mark_dirty(doc, *rect)
+
+        # Krita reads and writes stay on this (main) thread
+        workers.map_tiles([rect for rect, _ in grouped], read, blend, write)
+        return len(grouped)
+
+    def cmd_curve_stroke(self, params):
+        """Paint a stroke along a Catmull-Rom or cubic Bezier curve given by control points."""
+        points = params.get("points", [])
+        kind = params.get("curve", "catmull_rom")
+        pressure = params.get("pressure")
+        tolerance = params.get("tolerance", curves.CURVE_TOLERANCE)
+
+        if kind not in curves.CURVE_KINDS:
+            return {"error": f"Unknown curve: {kind}"}
+        per_point = pressure is not None and not isinstance(pressure, (int, float))
+        if per_point:
+            if len(pressure) != len(points):
+                return {"error": "Need one pressure value per control point"}
+        elif len(points) and all(len(p) > 2 for p in points):
+            pressure, per_point = [p[2] for p in points], True
 
-        return {"status": "ok", "points_count": len(points), "hardness": hardness}
+        try:
+            polyline, pressures = curves.tessellate(
+                points, kind, pressure if per_point else None, max(0.01, tolerance)
+            )
+        except ValueError as e:
+            return {"error": str(e)}
+
+        # The tessellated path goes through the regular stroke rasterizer
+        stroke_params = dict(params, points=polyline)
+        if pressures is not None:
+            stroke_params["pressure"] = pressures
+        result = self.cmd_stroke(stroke_params)
+        if "error" not in result:
+            result["control_points"] = len(points)
+        return result
 
     def cmd_fill(self, params):
+        """Bucket fill from a seed point with the current color."""
+        if "radius" in params:
+            return self.fill_circle(params)
+
+        x = int(params.get("x", 0))
+        y = int(params.get("y", 0))
+        tolerance = params.get("tolerance", 32)
+        mode = params.get("mode", "contiguous")
+        sample_merged = params.get("sample_merged", False)
+        opacity = min(1.0, max(0.0, params.get("opacity", 1.0)))
+        blend_mode = params.get("blend_mode", "normal")
+
+        if mode not in ("contiguous", "global"):
+            return {"error": f"Unknown fill mode: {mode}"}
+        error = self.check_blend_mode(blend_mode)
+        if error:
+            return error
+        if not brush.HAS_NUMPY:
+            return {"error": "Bucket fill requires NumPy in Krita's Python (pass radius to paint a filled circle)"}
+
+        layer = self.get_active_layer()
+        if not layer:
+            return {"error": "No active layer"}
+
+        doc = self.get_active_document()
+        view = self.get_active_view()
+
+        if not view:
+            return {"error": "No active view"}
+
+        width = doc.width()
+        height = doc.height()
+        if not (0 <= x < width and 0 <= y < height):
+            return {"error": "Fill point out of bounds"}
+
+        # Get current foreground color
+        fg = view.foregroundColor()
+        qcolor = fg.colorForCanvas(view.canvas())
+        r, g, b = qcolor.red(), qcolor.green(), qcolor.blue()
+
+        pixels = brush.pixel_array(layer.pixelData(0, 0, width, height), width, height)
+        if sample_merged:
+            # Match against what's visible rather than the active layer alone
+            self.flush_refresh()
+            source = brush.pixel_array(doc.rootNode().projectionPixelData(0, 0, width, height), width, height)
+        else:
+            source = pixels
+
+        mask = fill.fill_mask(source, x, y, tolerance, contiguous=(mode == "contiguous"))
+        bounds = fill.mask_bounds(mask)
+        if bounds is None:
+            return {"status": "ok", "x": x, "y": y, "mode": mode, "pixels": 0}
+
+        # Only the bounding box of the filled area is written back
+        bx, by, bw, bh = bounds
+        region = pixels[by:by + bh, bx:bx + bw]
+        alpha = mask[by:by + bh, bx:bx + bw].astype("uint8")
+        alpha *= int(255 * opacity)
+        compositing.composite(region, alpha, 0, 0, (b, g, r), blend_mode)
+
+        layer.setPixelData(region.tobytes(), bx, by, bw, bh)
+        self.mark_dirty(doc, bx, by, bw, bh)
+
+        return {
+            "status": "ok", "x": x, "y": y, "mode": mode,
+            "pixels": int(mask.sum()), "bounds": [bx, by, bw, bh]
+        }
+
+    def fill_circle(self, params):
         """Fill a circular area with current color."""
         x = params.get("x", 0)
         y = params.get("y", 0)
         radius = params.get("radius", 50)
+        blend_mode = params.get("blend_mode", "normal")
+
+        error = self.check_blend_mode(blend_mode)
+        if error:
+            return error
 
         layer = self.get_active_layer()
         if not layer:
@@ -463,6 +833,15 @@ class KritaMCPExtension(Extension):
 
         # Get existing pixel data
         existing = layer.pixelData(x1, y1, w, h)
+
+        if brush.HAS_NUMPY:
+            pixels = brush.pixel_array(existing, w, h)
+            alpha = brush.circle_mask(x - x1, y - y1, radius, w, h)
+            compositing.composite(pixels, alpha, 0, 0, (b, g, r), blend_mode)
+            layer.setPixelData(pixels.tobytes(), x1, y1, w, h)
+            self.mark_dirty(doc, x1, y1, w, h)
+            return {"status": "ok", "x": x, "y": y, "radius": radius}
+
         pixels = bytearray(existing)
 
         # Draw circle
@@ -479,18 +858,27 @@ class KritaMCPExtension(Extension):
                     pixels[idx+3] = 255  # A
 
         layer.setPixelData(bytes(pixels), x1, y1, w, h)
-        doc.refreshProjection()
+        self.mark_dirty(doc, x1, y1, w, h)
 
         return {"status": "ok", "x": x, "y": y, "radius": radius}
 
     def cmd_draw_shape(self, params):
-        """Draw a shape (rectangle, ellipse, line)."""
+        """Draw an anti-aliased shape (rectangle, ellipse, polygon, line), filled and/or outlined."""
         shape = params.get("shape", "rectangle")
         x = params.get("x", 0)
         y = params.get("y", 0)
         width = params.get("width", 100)
         height = params.get("height", 100)
         fill = params.get("fill", True)
+        stroke = params.get("stroke", False)
+        line_width = params.get("line_width", 2)
+        antialias = params.get("antialias", True)
+        opacity = min(1.0, max(0.0, params.get("opacity", 1.0)))
+        blend_mode = params.get("blend_mode", "normal")
+
+        error = self.check_blend_mode(blend_mode)
+        if error:
+            return error
 
         layer = self.get_active_layer()
         if not layer:
@@ -507,6 +895,77 @@ class KritaMCPExtension(Extension):
         qcolor = fg.colorForCanvas(view.canvas())
         r, g, b = qcolor.red(), qcolor.green(), qcolor.blue()
 
+        if not brush.HAS_NUMPY:
+            return self.draw_shape_legacy(params, layer, doc, (r, g, b))
+
+        stroke_width = line_width if stroke else 0
+        if shape == "line":
+            x2 = params.get("x2", x + width)
+            y2 = params.get("y2", y + height)
+            geometry = shapes.Line(x, y, x2, y2, line_width)
+            fill, stroke_width = True, 0
+        elif shape == "rectangle":
+            geometry = shapes.Rect(x, y, width, height)
+        elif shape == "ellipse":
+            geometry = shapes.Ellipse(x, y, width, height)
+        elif shape == "polygon":
+            points = params.get("points", [])
+            if len(points) < 3:
+                return {"error": "Need at least 3 points for a polygon"}
+            geometry = shapes.Polygon(points)
+        else:
+            return {"error": f"Unknown shape: {shape}"}
+
+        if not fill and not stroke_width:
+            return {"error": "Nothing to draw: enable fill and/or stroke"}
+
+        region = shapes.shape_region(geometry, doc.width(), doc.height(), stroke_width)
+        if region is None:
+            return {"status": "ok", "shape": shape}
+
+        # Only layer tiles the shape or its outline may cover are read and written
+        rx, ry, rw, rh = region
+        cells = [(rx + tx, ry + ty, tw, th, solid)
+                 for tx, ty, tw, th, solid in shapes.shape_tiles(geometry, rx, ry, rw, rh, fill, stroke_width)]
+        boxes = [(x, y, x + w, y + h) for x, y, w, h, _ in cells]
+        grouped = tiles.group_by_tile(boxes, doc.width(), doc.height(), merge_below=workers.PARALLEL_MIN_PIXELS)
+        members = dict(grouped)
+
+        def read(rect):
+            tx, ty, tw, th = rect
+            return brush.pixel_array(layer.pixelData(tx, ty, tw, th), tw, th)
+
+        def rasterize(rect, pixels):
+            tx, ty = rect[0], rect[1]
+            for i in members[rect]:
+                x, y, w, h, solid = cells[i]
+                if solid:
+                    cover = np.ones((h, w), dtype=np.float32)
+                else:
+                    cover = shapes.tile_coverage(geometry, x, y, w, h, fill, stroke_width, antialias)
+                alpha = (cover * (255 * opacity) + 0.5).astype("uint8")
+                compositing.composite(pixels, alpha, x - tx, y - ty, (b, g, r), blend_mode)
+            return pixels
+
+        def write(rect, pixels):
+            layer.setPixelData(pixels.tobytes(), *rect)
+            self.mark_dirty(doc, *rect)
+
+        # Coverage is computed on the worker threads for large shapes
+        workers.map_tiles([rect for rect, _ in grouped], read, rasterize, write)
+
+        return {"status": "ok", "shape": shape}
+
+    def draw_shape_legacy(self, params, layer, doc, color):
+        """Per-pixel shape drawing used when NumPy is unavailable (no outlines or polygons)."""
+        shape = params.get("shape", "rectangle")
+        x = params.get("x", 0)
+        y = params.get("y", 0)
+        width = params.get("width", 100)
+        height = params.get("height", 100)
+        fill = params.get("fill", True)
+        r, g, b = color
+
         if shape == "line":
             # Draw line using pixel data
             x2 = params.get("x2", x + width)
@@ -547,6 +1006,7 @@ class KritaMCPExtension(Extension):
                                     pixels[idx+3] = 255
 
                 layer.setPixelData(bytes(pixels), x1_bound, y1_bound, w, h)
+                self.mark_dirty(doc, x1_bound, y1_bound, w, h)
         elif shape == "rectangle" and fill:
             # Draw filled rectangle using pixel data
             x1 = max(0, int(x))
@@ -559,6 +1019,7 @@ class KritaMCPExtension(Extension):
             if w > 0 and h > 0:
                 pixel_data = bytes([b, g, r, 255] * (w * h))
                 layer.setPixelData(pixel_data, x1, y1, w, h)
+                self.mark_dirty(doc, x1, y1, w, h)
         elif shape == "ellipse" and fill:
             # Draw filled ellipse using pixel data
             cx = x + width / 2
@@ -590,31 +1051,153 @@ class KritaMCPExtension(Extension):
                             pixels[idx+3] = 255
 
                 layer.setPixelData(bytes(pixels), x1, y1, w, h)
+                self.mark_dirty(doc, x1, y1, w, h)
         else:
             return {"error": f"Shape '{shape}' with current options not supported"}
 
-        doc.refreshProjection()
-
         return {"status": "ok", "shape": shape}
 
     def cmd_get_canvas(self, params):
-        """Export current canvas to file and return path."""
+        """Export current canvas to file and return path, or return an inline preview."""
         filename = params.get("filename", "canvas.png")
 
         doc = self.get_active_document()
         if not doc:
             return {"error": "No active document"}
+        self.flush_refresh()
 
-        # Ensure filename has extension
-        if not filename.endswith('.png'):
-            filename += '.png'
+        if params.get("preview"):
+            return self.canvas_preview(doc, params)
 
-        filepath = os.path.join(CANVAS_OUTPUT_DIR, filename)
+        fmt = params.get("format", "png").lower()
+        if fmt not in export.IMAGE_FORMATS:
+            return {"error": f"Unsupported image format: {fmt}"}
 
-        # Export image
-        doc.exportImage(filepath, InfoObject())
+        # Ensure filename has the format's extension
+        base, ext = os.path.splitext(filename)
+        if ext.lower().lstrip('.') in export.IMAGE_FORMATS:
+            filename = base
+        filename += export.file_extension(fmt)
 
-        return {"status": "ok", "path": filepath}
+        filepath = os.path.join(CANVAS_OUTPUT_DIR, filename)
+        return self.start_export(doc, filepath, fmt, params)
+
+    def start_export(self, doc, filepath, fmt, params):
+        """Snapshot the projection and write it to a file on the export thread."""
+        if not export.reads_projection(doc):
+            # 16-bit, float, CMYK, ... go through Krita's exporter, which converts them
+            with metrics.registry.timed("encode", self.current_action):
+                doc.exportImage(filepath, InfoObject())
+            return {"status": "ok", "path": filepath}
+
+        if fmt == "png":
+            quality = export.png_quality(params.get("compression", export.DEFAULT_COMPRESSION))
+        else:
+            quality = params.get("quality", 90)
+
+        # Only the copy happens here; encoding and disk I/O don't block Krita
+        with metrics.registry.timed("encode", self.current_action):
+            image = export.projection_image(doc)
+            checksum = export.image_checksum(image)
+
+        # An unchanged canvas already written (or being written) the same way is
+        # reused. The checksum catches edits made in Krita, which the
+        # generation doesn't see.
+        doc_key, generation = self.content_generation(doc)
+        key = (doc_key, generation, checksum, export.IMAGE_FORMATS[fmt], quality)
+        job = export.export_jobs.find(filepath, key) if params.get("cache", True) else None
+        cached = job is not None
+
+        if not cached:
+            job = export.export_jobs.submit(image, filepath, fmt, quality, key)
+        return {
+            "status": "ok", "path": filepath, "job": job["job"], "state": job["state"],
+            "generation": generation, "cached": cached
+        }
+
+    def content_generation(self, doc):
+        """Return (document key, generation of its last change made through the plugin)."""
+        key = tracking.document_key(doc)
+        return key, self.changes.modified_generation(key)
+
+    def canvas_preview(self, doc, params):
+        """Encode a downscaled copy of the projection in memory (no file round-trip)."""
+        max_size = params.get("max_size", 1024)
+        fmt = params.get("format", "png").lower()
+        quality = params.get("quality", 85)
+
+        if fmt not in export.IMAGE_FORMATS:
+            return {"error": f"Unsupported preview format: {fmt}"}
+        if not export.reads_projection(doc):
+            return {"error": "Inline previews need an 8-bit RGBA document; export to a file instead"}
+
+        with metrics.registry.timed("encode", self.current_action):
+            image = export.projection_image(doc)
+            checksum = export.image_checksum(image)
+
+        # The checksum catches edits made in Krita, which the generation doesn't see
+        doc_key, generation = self.content_generation(doc)
+        key = (doc_key, generation, checksum, export.IMAGE_FORMATS[fmt], max_size, quality)
+        if params.get("cache", True):
+            preview = export.preview_cache.get(key)
+            if preview is not None:
+                return dict(preview, cached=True)
+
+        with metrics.registry.timed("encode", self.current_action):
+            image = export.downscale(image, max_size)
+            # PNG is lossless; Qt would treat quality as a compression level
+            data = export.encode_image(image, fmt, -1 if fmt == "png" else quality)
+
+        preview = {
+            "status": "ok",
+            "format": "jpeg" if fmt == "jpg" else fmt,
+            "width": image.width(),
+            "height": image.height(),
+            "generation": generation,
+            "data": base64.b64encode(data).decode("ascii")
+        }
+        export.preview_cache.put(key, preview)
+        return dict(preview, cached=False)
+
+    def cmd_get_canvas_diff(self, params):
+        """Return encoded tiles of the projection that changed since a generation."""
+        since = params.get("since", 0)
+        document = params.get("document")
+        fmt = params.get("format", "png").lower()
+        quality = params.get("quality", 85)
+
+        doc = self.get_active_document()
+        if not doc:
+            return {"error": "No active document"}
+        if fmt not in export.IMAGE_FORMATS:
+            return {"error": f"Unsupported image format: {fmt}"}
+        if not export.reads_projection(doc):
+            return {"error": "Canvas diffs need an 8-bit RGBA document; use krita_get_canvas instead"}
+        self.flush_refresh()
+
+        key = tracking.document_key(doc)
+        if document is not None and document != key:
+            # `since` came from another document; the client has nothing of this one
+            since = 0
+        changed = []
+        with metrics.registry.timed("encode", self.current_action):
+            for x, y, w, h in self.changes.changed_tiles(key, since, doc.width(), doc.height()):
+                image = export.projection_image(doc, x, y, w, h)
+                data = export.encode_image(image, fmt, -1 if fmt == "png" else quality)
+                changed.append({
+                    "x": x, "y": y, "width": w, "height": h,
+                    "data": base64.b64encode(data).decode("ascii")
+                })
+
+        return {
+            "status": "ok",
+            "generation": self.changes.generation,
+            "document": key,
+            "width": doc.width(),
+            "height": doc.height(),
+            "format": "jpeg" if fmt == "jpg" else fmt,
+            "tiles": changed
+        }
 
     def cmd_undo(self, params):
         """Undo last action."""
@@ -622,6 +1205,10 @@ class KritaMCPExtension(Extension):
         action = app.action('edit_undo')
         if action:
             action.trigger()
+            doc = self.get_active_document()
+            if doc:
+                # We can't tell which pixels the undo touched
+                self.changes.mark_all(tracking.document_key(doc))
             return {"status": "ok"}
         return {"error": "Could not trigger undo"}
 
@@ -631,6 +1218,10 @@ class KritaMCPExtension(Extension):
         action = app.action('edit_redo')
         if action:
             action.trigger()
+            doc = self.get_active_document()
+            if doc:
+                # We can't tell which pixels the redo touched
+                self.changes.mark_all(tracking.document_key(doc))
             return {"status": "ok"}
         return {"error": "Could not trigger redo"}
 
@@ -651,11 +1242,10 @@ class KritaMCPExtension(Extension):
         color = QColor(bg_color)
         r, g, b = color.red(), color.green(), color.blue()
 
-        # Fill entire layer with color
-        pixel_data = bytes([b, g, r, 255] * (width * height))
-        layer.setPixelData(pixel_data, 0, 0, width, height)
+        # Fill entire layer with color, tile by tile
+        tiles.fill_solid(layer, 0, 0, width, height, (b, g, r, 255))
 
-        doc.refreshProjection()
+        self.mark_dirty(doc)
 
         return {"status": "ok", "color": bg_color}
 
@@ -668,8 +1258,15 @@ class KritaMCPExtension(Extension):
         doc = self.get_active_document()
         if not doc:
             return {"error": "No active document"}
+        self.flush_refresh()
 
-        doc.exportImage(filepath, InfoObject())
+        fmt = os.path.splitext(filepath)[1].lower().lstrip('.')
+        if fmt in export.IMAGE_FORMATS:
+            return self.start_export(doc, filepath, fmt, params)
+
+        # Other formats (.kra, .psd, .tiff, ...) go through Krita's exporters
+        with metrics.registry.timed("encode", self.current_action):
+            doc.exportImage(filepath, InfoObject())
 
         return {"status": "ok", "path": filepath}
 
@@ -681,10 +1278,12 @@ class KritaMCPExtension(Extension):
         doc = self.get_active_document()
         if not doc:
             return {"error": "No active document"}
+        self.flush_refresh()
 
         # Get projection pixel data at point
         layer = doc.rootNode()
-        pixel_data = layer.projectionPixelData(x, y, 1, 1)
+        # QByteArray items are 1-byte strings; bytes items are ints
+        pixel_data = bytes(layer.projectionPixelData(x, y, 1, 1))
 
         if len(pixel_data) >= 4:
             # RGBA
@@ -694,22 +1293,98 @@ class KritaMCPExtension(Extension):
 
         return {"error": "Could not read pixel"}
 
+    def cmd_sample(self, params):
+        """Sample many points and/or compute region statistics from one projection read."""
+        points = params.get("points")
+        rect = params.get("rect")  # [x, y, width, height]
+        palette_size = params.get("palette_size", 5)
+
+        # points may be a NumPy array from the binary wire format, so test its length
+        if points is None:
+            points = []
+        if not len(points) and not rect:
+            return {"error": "Provide points and/or rect to sample"}
+        if rect and not brush.HAS_NUMPY:
+            return {"error": "Region statistics require NumPy in Krita's Python"}
+        if not isinstance(palette_size, int) or not 0 <= palette_size <= sampling.MAX_PALETTE_SIZE:
+            return {"error": f"palette_size must be an integer from 0 to {sampling.MAX_PALETTE_SIZE}"}
+
+        doc = self.get_active_document()
+        if not doc:
+            return {"error": "No active document"}
+        self.flush_refresh()
+
+        # One fetch covering every point and the rectangle
+        xs = [int(p[0]) for p in points]
+        ys = [int(p[1]) for p in points]
+        if rect:
+            rx, ry, rw, rh = (int(v) for v in rect)
+            xs += [rx, rx + rw - 1]
+            ys += [ry, ry + rh - 1]
+        left = max(0, min(xs))
+        top = max(0, min(ys))
+        w = min(doc.width(), max(xs) + 1) - left
+        h = min(doc.height(), max(ys) + 1) - top
+
+        if w <= 0 or h <= 0:
+            return {"error": "Sample area out of bounds"}
+
+        data = doc.rootNode().projectionPixelData(left, top, w, h)
+        result = {"status": "ok"}
+
+        if len(points):
+            result["colors"] = sampling.sample_points(data, left, top, w, h, points)
+
+        if rect:
+            x1, y1 = max(rx, left) - left, max(ry, top) - top
+            x2, y2 = min(rx + rw, left + w) - left, min(ry + rh, top + h) - top
+            if x2 <= x1 or y2 <= y1:
+                return {"error": "Sample rect out of bounds"}
+            pixels = brush.pixel_array(data, w, h)[y1:y2, x1:x2]
+            result["stats"] = sampling.region_stats(pixels, palette_size)
+            result["rect"] = [x1 + left, y1 + top, x2 - x1, y2 - y1]
+
+        return result
+
     def cmd_list_brushes(self, params):
         """List available brush presets."""
         filter_str = params.get("filter", "")
         limit = params.get("limit", 50)
+        fuzzy = params.get("fuzzy", False)
 
-        presets = Krita.instance().resources("preset")
-        brush_list = []
+        if params.get("refresh"):
+            # Pick up presets installed since the index was built
+            self.preset_index.invalidate()
 
-        for name, preset in presets.items():
-            if filter_str.lower() in name.lower():
-                brush_list.append(name)
-                if len(brush_list) >= limit:
-                    break
+        brush_list = self.preset_index.search(filter_str, limit, fuzzy)
 
         return {"status": "ok", "brushes": brush_list, "count": len(brush_list)}
 
+    def cmd_batch(self, params):
+        """Run a list of commands in order with a single projection refresh at the end."""
+        commands = params.get("commands", [])
+        stop_on_error = params.get("stop_on_error", False)
+
+        if not isinstance(commands, list):
+            return {"error": "commands must be a list"}
+
+        # Painted areas accumulate and are refreshed once after the batch
+        results = []
+        for command in commands:
+            if not isinstance(command, dict):
+                result = {"error": "Each command must be an object"}
+            elif command.get("action") == "batch":
+                result = {"error": "Nested batches are not supported"}
+            else:
+                result = self.run_command(command)
+            results.append(result)
+
+            if stop_on_error and "error" in result:
+                break
+
+        errors = sum(1 for result in results if "error" in result)
+        return {"status": "ok", "results": results, "count": len(results), "errors": errors}
+
 
 # Register the extension
 Krita.instance().addExtension(KritaMCPExtension(Krita.instance()))
@@ -0,0 +1,112 @@
+"""
+Spline tessellation for the Krita MCP Bridge.
+Turns a few cubic Bezier or Catmull-Rom control points into a polyline
+for the stroke rasterizer. Segments are subdivided adaptively until they
+are flat to within a tolerance, so straight runs cost a couple of points
+and tight bends get as many as they need.
+"""
+
+import math
+
+CURVE_TOLERANCE = 0.25  # Max distance (pixels) between the curve and its polyline
+MAX_DEPTH = 16          # Subdivision limit per segment
+
+CURVE_KINDS = ("catmull_rom", "bezier")
+
+
+def bezier_segments(points):
+    """
+    Split cubic Bezier control points [anchor, c1, c2, anchor, c1, c2, anchor, ...]
+    into (p0, c1, c2, p3, i0, i3) segments; i0 and i3 index the anchors.
+    """
+    if len(points) < 4 or (len(points) - 1) % 3:
+        raise ValueError("Bezier curves need 3n+1 control points (anchor, control, control, anchor, ...)")
+    return [
+        (points[i], points[i + 1], points[i + 2], points[i + 3], i, i + 3)
+        for i in range(0, len(points) - 1, 3)
+    ]
+
+
+def catmull_rom_segments(points):
+    """
+    Convert points for a uniform Catmull-Rom spline passing through all of
+    them into Bezier segments. The end tangents mirror their neighbors.
+    """
+    if len(points) < 2:
+        raise ValueError("Catmull-Rom curves need at least 2 points")
+    segments = []
+    last = len(points) - 1
+    for i in range(last):
+        p0 = points[max(i - 1, 0)]
+        p1 = points[i]
+        p2 = points[i + 1]
+        p3 = points[min(i + 2, last)]
+        c1 = (p1[0] + (p2[0] - p0[0]) / 6, p1[1] + (p2[1] - p0[1]) / 6)
+        c2 = (p2[0] - (p3[0] - p1[0]) / 6, p2[1] - (p3[1] - p1[1]) / 6)
+        segments.append((p1, c1, c2, p2, i, i + 1))
+    return segments
+
+
+def _distance_to_chord(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    t = min(1.0, max(0.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length_sq))
+    return math.hypot(p[0] - (a[0] + t * dx), p[1] - (a[1] + t * dy))
+
+
+def _is_flat(p0, c1, c2, p3, tolerance):
+    # The curve lies in the hull of its control points, so it is within
+    # tolerance of the chord when both inner control points are
+    return (_distance_to_chord(c1, p0, p3) <= tolerance and
+            _distance_to_chord(c2, p0, p3) <= tolerance)
+
+
+def _flatten_segment(p0, c1, c2, p3, tolerance):
+    """Return [(x, y, t), ...] for a cubic, excluding its start point."""
+    out = []
+    stack = [(p0, c1, c2, p3, 0.0, 1.0, 0)]
+    while stack:
+        a, b, c, d, t0, t1, depth = stack.pop()
+        if depth >= MAX_DEPTH or _is_flat(a, b, c, d, tolerance):
+            out.append((d[0], d[1], t1))
+            continue
+        # de Casteljau split at t = 0.5
+        ab = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+        bc = ((b[0] + c[0]) / 2, (b[1] + c[1]) / 2)
+        cd = ((c[0] + d[0]) / 2, (c[1] + d[1]) / 2)
+        abc = ((ab[0] + bc[0]) / 2, (ab[1] + bc[1]) / 2)
+        bcd = ((bc[0] + cd[0]) / 2, (bc[1] + cd[1]) / 2)
+        mid = ((abc[0] + bcd[0]) / 2, (abc[1] + bcd[1]) / 2)
+        tm = (t0 + t1) / 2
+        # Second half first so the first half is popped (and emitted) first
+        stack.append((mid, bcd, cd, d, tm, t1, depth + 1))
+        stack.append((a, ab, abc, mid, t0, tm, depth + 1))
+    return out
+
+
+def tessellate(points, kind="catmull_rom", pressures=None, tolerance=CURVE_TOLERANCE):
+    """
+    Return (polyline, pressures) for a curve through control points.
+
+    pressures, if given, has one value per control point. Along each
+    segment pressure is interpolated between the segment's anchors by the
+    curve parameter.
+    """
+    if kind == "bezier":
+        segments = bezier_segments(points)
+    elif kind == "catmull_rom":
+        segments = catmull_rom_segments(points)
+    else:
+        raise ValueError(f"Unknown curve kind: {kind}")
+
+    start = segments[0][0]
+    polyline = [[start[0], start[1]]]
+    levels = [pressures[0]] if pressures is not None else None
+    for p0, c1, c2, p3, i0, i3 in segments:
+        for x, y, t in _flatten_segment(p0, c1, c2, p3, tolerance):
+            polyline.append([x, y])
+            if levels is not None:
+                levels.append(pressures[i0] + t * (pressures[i3] - pressures[i0]))
+    return polyline, levels
@@ -0,0 +1,226 @@
+"""
+Canvas encoding for the Krita MCP Bridge.
+Turns projection pixel data into downscaled PNG/JPEG/WebP bytes without
+going through doc.exportImage and a file on disk, and writes full-size
+exports as background jobs: the projection is snapshotted on the main
+thread and encoded and written on a worker thread.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import itertools
+import os
+import threading
+import time
+import zlib
+
+from PyQt5.QtCore import Qt, QBuffer, QByteArray, QIODevice
+from PyQt5.QtGui import QImage
+
+from . import metrics
+
+EXPORT_WORKERS = 1         # Background encode/write threads
+EXPORT_JOB_HISTORY = 64    # Finished jobs kept for status queries
+DEFAULT_COMPRESSION = 6    # PNG zlib level (0-9) when none is given
+PREVIEW_CACHE_SIZE = 8     # Recent inline previews kept for repeat requests
+
+# Formats accepted by encode_image, mapped to Qt image writer names
+IMAGE_FORMATS = {
+    "png": "PNG",
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+    "webp": "WEBP",
+}
+
+
+def reads_projection(doc):
+    """Whether projection_image understands a document's pixel data (8-bit RGBA only)."""
+    return doc.colorModel() == "RGBA" and doc.colorDepth() == "U8"
+
+
+def projection_image(doc, x=0, y=0, width=None, height=None):
+    """
+    Return a QImage copy of the merged projection for a document region.
+    Check reads_projection(doc) first; other color spaces come back garbled.
+    """
+    if width is None:
+        width, height = doc.width(), doc.height()
+    data = doc.rootNode().projectionPixelData(x, y, width, height)
+    # RGBA U8 pixel data is BGRA in memory, which is QImage's ARGB32 layout
+    image = QImage(data, width, height, width * 4, QImage.Format_ARGB32)
+    return image.copy()
+
+
+def image_checksum(image):
+    """CRC-32 of a QImage's pixels; tells canvas contents apart without encoding them."""
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    return zlib.crc32(bits)
+
+
+def downscale(image, max_size):
+    """Scale an image down so its longest side is at most max_size pixels."""
+    if not max_size or max(image.width(), image.height()) <= max_size:
+        return image
+    return image.scaled(max_size, max_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+
+def encode_image(image, fmt="png", quality=-1):
+    """Encode a QImage in memory and return the bytes. quality is 0-100, -1 for default."""
+    writer = IMAGE_FORMATS.get(fmt.lower())
+    if writer is None:
+        raise ValueError(f"Unsupported image format: {fmt}")
+
+    buffer_data = QByteArray()
+    buffer = QBuffer(buffer_data)
+    buffer.open(QIODevice.WriteOnly)
+    ok = image.save(buffer, writer, quality)
+    buffer.close()
+    if not ok:
+        raise ValueError(f"Qt could not encode {writer} (image format plugin missing?)")
+    return bytes(buffer_data)
+
+
+def file_extension(fmt):
+    """Return the usual file extension for an IMAGE_FORMATS key."""
+    return ".jpg" if IMAGE_FORMATS[fmt] == "JPEG" else "." + fmt
+
+
+def png_quality(compression):
+    """Map a zlib compression level (0-9) to the quality value Qt's PNG writer expects."""
+    compression = min(9, max(0, int(compression)))
+    # Qt derives the level as (100 - quality) * 9 / 91
+    return 100 - (compression * 91 + 8) // 9
+
+
+class ExportJobs:
+    """Background image writes, tracked by job ID."""
+
+    def __init__(self, workers=EXPORT_WORKERS, history=EXPORT_JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self.executor = None
+        self.jobs = OrderedDict()  # id -> (info dict, future)
+        self.outputs = {}          # path -> (key, id) of the latest job writing it
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def submit(self, image, path, fmt="png", quality=-1, key=None):
+        """
+        Queue a QImage to be written to path; return the job info.
+
+        key identifies the content and encoding (see find()).
+        """
+        writer = IMAGE_FORMATS.get(fmt.lower())
+        if writer is None:
+            raise ValueError(f"Unsupported image format: {fmt}")
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kritamcp-export")
+            info = {
+                "job": next(self.ids),
+                "state": "queued",
+                "path": path,
+                "format": "jpeg" if writer == "JPEG" else fmt.lower(),
+                "width": image.width(),
+                "height": image.height(),
+                "queued_at": time.time(),
+            }
+            future = self.executor.submit(self._write, info, image, path, writer, quality)
+            self.jobs[info["job"]] = (info, future)
+            if key is not None:
+                self.outputs[path] = (key, info["job"])
+            self._prune()
+            return dict(info)
+
+    def _write(self, info, image, path, writer, quality):
+        with self.lock:
+            info["state"] = "running"
+        started = time.monotonic()
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Write next to the target and rename, so readers never see a partial file
+            partial = path + ".part"
+            if not image.save(partial, writer, quality):
+                raise IOError(f"Qt could not write {writer} to {path}")
+            os.replace(partial, path)
+            with self.lock:
+                info.update(state="done", bytes=os.path.getsize(path))
+        except Exception as e:
+            with self.lock:
+                info.update(state="error", error=str(e))
+        finally:
+            seconds = time.monotonic() - started
+            with self.lock:
+                info["seconds"] = round(seconds, 3)
+            # Background writes are reported apart from the commands that queued them
+            metrics.registry.observe("encode", "export", seconds)
+
+    def _prune(self):
+        # Forget the oldest finished jobs beyond the history limit
+        finished = [job for job, (_, future) in self.jobs.items() if future.done()]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job]
+
+    def find(self, path, key):
+        """
+        Return info for the latest job writing path if it was submitted with
+        the same key and has not failed (and its file is still there), else None.
+        """
+        with self.lock:
+            latest = self.outputs.get(path)
+            if latest is None or latest[0] != key or latest[1] not in self.jobs:
+                return None
+            info = dict(self.jobs[latest[1]][0])
+        if info["state"] == "error" or (info["state"] == "done" and not os.path.exists(path)):
+            return None
+        return info
+
+    def status(self, job):
+        """Return a copy of a job's info, or None if unknown."""
+        with self.lock:
+            entry = self.jobs.get(job)
+            return dict(entry[0]) if entry else None
+
+    def wait(self, job, timeout=None):
+        """Wait up to timeout seconds for a job to finish; return its info, or None if unknown."""
+        with self.lock:
+            entry = self.jobs.get(job)
+        if entry is None:
+            return None
+        try:
+            entry[1].result(timeout)
+        except FutureTimeoutError:
+            pass
+        return self.status(job)
+
+
+# Shared export job queue
+export_jobs = ExportJobs()
+
+
+class PreviewCache:
+    """Small LRU of encoded previews keyed by document, generation and encoding."""
+
+    def __init__(self, maxsize=PREVIEW_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+# Previews are only built on the main thread, so this needs no lock
+preview_cache = PreviewCache()
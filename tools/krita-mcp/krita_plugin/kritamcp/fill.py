@@ -0,0 +1,129 @@
+"""
+Bucket fill for the Krita MCP Bridge.
+Scanline flood fill over NumPy arrays: pixels are grouped into horizontal
+runs of matching color, runs that overlap between rows are joined, and
+the connected runs are found with array operations rather than a
+run-by-run walk.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # Krita's bundled Python does not always ship NumPy
+    np = None
+
+from . import workers
+
+
+def color_match(pixels, x, y, tolerance):
+    """Return a bool mask of pixels within tolerance (max channel delta, 0-255) of pixel (x, y)."""
+    seed = pixels[y, x].copy()
+    match = np.empty(pixels.shape[:2], dtype=bool)
+
+    def run(y0, y1):
+        rows = pixels[y0:y1]
+        if tolerance <= 0:
+            # Exact match: compare whole BGRA pixels as 32-bit words
+            np.equal(rows.view(np.uint32)[..., 0], seed.view(np.uint32)[0], out=match[y0:y1])
+            return
+        band = None
+        for channel in range(4):
+            # |a - b| without widening: max(a, b) - min(a, b) stays in uint8
+            values = rows[..., channel]
+            delta = np.maximum(values, seed[channel]) - np.minimum(values, seed[channel])
+            close = delta <= tolerance
+            band = close if band is None else band & close
+        match[y0:y1] = band
+
+    workers.run_bands(pixels.shape[0], pixels.shape[1], run)
+    return match
+
+
+def _runs(match):
+    """Return (rows, starts, ends) of horizontal runs of True, ordered by row then start."""
+    h, w = match.shape
+    padded = np.zeros((h, w + 2), dtype=np.int8)
+    padded[:, 1:-1] = match
+    edges = np.diff(padded, axis=1)
+    start_rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return start_rows, starts, ends
+
+
+def _overlaps(rows, starts, ends, width):
+    """
+    Return index arrays (a, b) pairing each run a with every run b in the
+    next row that overlaps it (4-connectivity).
+    """
+    # Runs are ordered by row then start, and runs in a row don't overlap, so
+    # row-major keys of both starts and ends are sorted
+    stride = width + 1
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    below = (rows + 1) * stride
+    # The runs below run a that overlap it are a contiguous index range:
+    # from the first that ends after a starts to the first that starts after a ends
+    lo = np.searchsorted(end_keys, below + starts, side="right")
+    hi = np.searchsorted(start_keys, below + ends, side="left")
+    counts = hi - lo
+    a = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(len(a)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return a, np.repeat(lo, counts) + offsets
+
+
+def _components(n, a, b):
+    """Label the connected components of n nodes joined by edges (a, b); returns the labels."""
+    labels = np.arange(n)
+    while len(a):
+        # Hook each edge's higher root onto the lower one, then flatten the
+        # trees; labels only ever decrease, so this converges
+        la, lb = labels[a], labels[b]
+        low = np.minimum(la, lb)
+        np.minimum.at(labels, la, low)
+        np.minimum.at(labels, lb, low)
+        while True:
+            parents = labels[labels]
+            if np.array_equal(parents, labels):
+                break
+            labels = parents
+        # Edges inside one component are done
+        pending = labels[a] != labels[b]
+        a, b = a[pending], b[pending]
+    return labels
+
+
+def contiguous_region(match, x, y):
+    """Return the 4-connected region of `match` containing (x, y) as a bool mask."""
+    h, w = match.shape
+    if not match[y, x]:
+        return np.zeros_like(match)
+
+    rows, starts, ends = _runs(match)
+    # The run holding the seed: the first in row y that ends after x
+    seed = np.searchsorted(rows * (w + 1) + ends, y * (w + 1) + x, side="right")
+
+    labels = _components(len(rows), *_overlaps(rows, starts, ends, w))
+    region = labels == labels[seed]
+
+    # Rasterize the region's runs with a cumulative sum of +1/-1 edges; runs
+    # in a row are separated by gaps, so no two edges share a position
+    edges = np.zeros((h, w + 1), dtype=np.int8)
+    edges[rows[region], starts[region]] = 1
+    edges[rows[region], ends[region]] = -1
+    return np.cumsum(edges, axis=1, dtype=np.int8)[:, :w] > 0
+
+
+def fill_mask(pixels, x, y, tolerance=32, contiguous=True):
+    """Return the bool mask a bucket fill seeded at (x, y) would cover."""
+    match = color_match(pixels, x, y, tolerance)
+    if contiguous:
+        return contiguous_region(match, x, y)
+    return match
+
+
+def mask_bounds(mask):
+    """Return (x, y, width, height) of the True area of a mask, or None if empty."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)
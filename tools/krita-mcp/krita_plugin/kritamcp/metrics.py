@@ -0,0 +1,155 @@
+"""
+Latency metrics for the Krita MCP Bridge.
+Commands are timed in phases: queue wait (HTTP thread push to main thread
+pickup), execute, projection refresh and image encode. Each phase keeps a
+fixed-bucket histogram per action, rendered in the Prometheus text format
+for GET /metrics and summarized as JSON for GET /stats.
+"""
+
+import bisect
+from contextlib import contextmanager
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds - customize these as needed
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Phase -> help text; each phase is exported as kritamcp_<phase>_seconds
+PHASES = {
+    "queue_wait": "Time from HTTP receipt until the main thread picks the command up.",
+    "execute": "Time spent running the command on the main thread.",
+    "refresh": "Time spent in Document.refreshProjection.",
+    "encode": "Time spent reading back and encoding or writing images.",
+}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Thread-safe command counters and per-phase, per-action latency histograms."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}  # (phase, action) -> [bucket counts (+Inf last), sum, max]
+        self.commands = {}    # (action, status) -> count
+        self.timeouts = {}    # action -> count
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def observe(self, phase, action, seconds):
+        """Record one duration for a phase of an action."""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            entry = self.histograms.get((phase, action))
+            if entry is None:
+                entry = self.histograms[(phase, action)] = [[0] * (len(self.buckets) + 1), 0.0, 0.0]
+            entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    @contextmanager
+    def timed(self, phase, action):
+        """Time the body of a with block as one observation."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, action, time.perf_counter() - started)
+
+    def count_command(self, action, result):
+        status = "error" if "error" in result else "ok"
+        with self.lock:
+            self.commands[(action, status)] = self.commands.get((action, status), 0) + 1
+
+    def count_timeout(self, action):
+        with self.lock:
+            self.timeouts[action] = self.timeouts.get(action, 0) + 1
+
+    def _quantile(self, counts, total, peak, q):
+        # Linear interpolation within the bucket holding the rank, like
+        # Prometheus' histogram_quantile; the +Inf bucket reports the max
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.buckets, counts):
+            if n and seen + n >= rank:
+                return min(peak, lower + (bound - lower) * (rank - seen) / n)
+            seen += n
+            lower = bound
+        return peak
+
+    def summary(self):
+        """Return {action: {"ok", "error", "timeouts", phase: {count, mean_ms, p50_ms, p95_ms, max_ms}}}."""
+        actions = {}
+
+        def entry(action):
+            return actions.setdefault(action, {"ok": 0, "error": 0, "timeouts": 0})
+
+        with self.lock:
+            for (action, status), count in self.commands.items():
+                entry(action)[status] = count
+            for action, count in self.timeouts.items():
+                entry(action)["timeouts"] = count
+            for (phase, action), (counts, total_seconds, peak) in self.histograms.items():
+                total = sum(counts)
+                entry(action)[phase] = {
+                    "count": total,
+                    "mean_ms": round(total_seconds / total * 1000, 3),
+                    "p50_ms": round(self._quantile(counts, total, peak, 0.5) * 1000, 3),
+                    "p95_ms": round(self._quantile(counts, total, peak, 0.95) * 1000, 3),
+                    "max_ms": round(peak * 1000, 3),
+                }
+        return actions
+
+    def prometheus(self, gauges=()):
+        """
+        Render everything in the Prometheus text exposition format.
+        gauges is a list of (name, help, value) sampled by the caller.
+        """
+        with self.lock:
+            commands = sorted(self.commands.items())
+            timeouts = sorted(self.timeouts.items())
+            histograms = {key: (list(counts), total) for key, (counts, total, _) in self.histograms.items()}
+
+        lines = [
+            "# HELP kritamcp_commands_total Commands executed, by action and outcome.",
+            "# TYPE kritamcp_commands_total counter",
+        ]
+        for (action, status), count in commands:
+            lines.append(f'kritamcp_commands_total{{action="{_label(action)}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP kritamcp_command_timeouts_total Requests that gave up waiting for their command.",
+            "# TYPE kritamcp_command_timeouts_total counter",
+        ]
+        for action, count in timeouts:
+            lines.append(f'kritamcp_command_timeouts_total{{action="{_label(action)}"}} {count}')
+
+        for phase, help_text in PHASES.items():
+            name = f"kritamcp_{phase}_seconds"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (hist_phase, action), (counts, total) in sorted(histograms.items()):
+                if hist_phase != phase:
+                    continue
+                action = _label(action)
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{action="{action}",le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{name}_bucket{{action="{action}",le="+Inf"}} {cumulative}')
+                lines.append(f'{name}_sum{{action="{action}"}} {total:.6f}')
+                lines.append(f'{name}_count{{action="{action}"}} {cumulative}')
+
+        for name, help_text, value in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+# Shared metrics for the HTTP threads, the main thread and export workers
+registry = Metrics()
@@ -0,0 +1,111 @@
+"""
+Brush preset index for the Krita MCP Bridge.
+Builds the preset name lookup structures once instead of rescanning
+Krita.instance().resources("preset") on every set_brush/list_brushes.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+import difflib
+import time
+
+MIN_REBUILD_INTERVAL = 5.0  # Seconds between rebuilds triggered by lookup misses
+FUZZY_CUTOFF = 0.6  # Minimum similarity (0-1) for fuzzy matches
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PresetIndex:
+    """Lowercased, sorted and trigram-indexed view of the installed brush presets."""
+
+    def __init__(self, load):
+        self.load = load  # Callable returning {name: preset}
+        self.presets = None
+        self.built_at = 0.0
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on the next lookup."""
+        self.presets = None
+
+    def ensure(self):
+        if self.presets is None:
+            self.build()
+
+    def build(self):
+        presets = self.load()
+        self.presets = presets
+        # Sorted by lowercase name so prefix lookups are a bisect
+        self.names = sorted(presets, key=lambda name: (name.lower(), name))
+        self.lowered = [name.lower() for name in self.names]
+        self.trigram_index = defaultdict(set)
+        for i, lowered in enumerate(self.lowered):
+            for trigram in _trigrams(lowered):
+                self.trigram_index[trigram].add(i)
+        self.built_at = time.monotonic()
+
+    def _prefix_ids(self, query):
+        start = bisect_left(self.lowered, query)
+        end = start
+        while end < len(self.lowered) and self.lowered[end].startswith(query):
+            end += 1
+        return range(start, end)
+
+    def _substring_ids(self, query):
+        if len(query) < 3:
+            return [i for i, lowered in enumerate(self.lowered) if query in lowered]
+        # Candidates must contain every trigram of the query
+        postings = sorted((self.trigram_index.get(t, set()) for t in _trigrams(query)), key=len)
+        candidates = set.intersection(*postings) if postings else set()
+        return sorted(i for i in candidates if query in self.lowered[i])
+
+    def search(self, query, limit=None, fuzzy=False):
+        """
+        Return preset names matching query, best first.
+
+        Ranking: exact (case-insensitive) match, then prefix matches, then other
+        substring matches by match position; ties go to the shorter name, then
+        alphabetical order. With fuzzy=True, close misspellings are appended.
+        """
+        self.ensure()
+        query = query.lower()
+        if not query:
+            return self.names[:limit] if limit else list(self.names)
+
+        prefix = sorted(self._prefix_ids(query), key=lambda i: (len(self.lowered[i]), i))
+        seen = set(prefix)
+        contains = sorted(
+            (i for i in self._substring_ids(query) if i not in seen),
+            key=lambda i: (self.lowered[i].find(query), len(self.lowered[i]), i)
+        )
+        ranked = [self.names[i] for i in prefix + contains]
+
+        if fuzzy and (limit is None or len(ranked) < limit):
+            matched = set(ranked)
+            n = len(self.names) if limit is None else limit - len(ranked)
+            for lowered in difflib.get_close_matches(query, self.lowered, n=n + len(matched), cutoff=FUZZY_CUTOFF):
+                name = self.names[bisect_left(self.lowered, lowered)]
+                if name not in matched:
+                    ranked.append(name)
+                    matched.add(name)
+
+        return ranked[:limit] if limit else ranked
+
+    def best_match(self, query):
+        """
+        Return (name, preset) for the best match, or (None, None).
+
+        A miss rebuilds the index once (rate limited) in case presets were
+        installed since it was built.
+        """
+        for attempt in range(2):
+            self.ensure()
+            names = self.search(query, limit=1, fuzzy=True)
+            if names:
+                return names[0], self.presets[names[0]]
+            if attempt == 0 and time.monotonic() - self.built_at >= MIN_REBUILD_INTERVAL:
+                self.invalidate()
+            else:
+                break
+        return None, None
@@ -0,0 +1,197 @@
+"""
+Anti-aliased shape rasterizer for the Krita MCP Bridge.
+Shapes are described by signed distance functions (negative inside).
+Pixel coverage is derived from the distance at each pixel center, for
+filled interiors and for outlines of any width.
+
+Work is done in tiles, and tiles that a conservative distance bound
+proves are empty (or fully covered) skip the per-pixel math. Cost
+therefore follows the covered area and outline length, not the
+bounding box.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:  # Krita's bundled Python does not always ship NumPy
+    np = None
+
+TILE_SIZE = 64  # Tile edge used to skip empty/solid areas
+
+
+class Shape:
+    """Base class: subclasses provide sdf() and bounds()."""
+
+    def sdf(self, px, py):
+        """Signed distance (pixels, negative inside) at arrays of points."""
+        raise NotImplementedError
+
+    def bound(self, px, py):
+        """
+        A 1-Lipschitz lower bound on |distance| with the sign of sdf().
+        Used to skip whole tiles; defaults to sdf() when that is exact.
+        """
+        return self.sdf(px, py)
+
+    def bounds(self):
+        """(x1, y1, x2, y2) extents of the filled shape."""
+        raise NotImplementedError
+
+
+class Rect(Shape):
+    def __init__(self, x, y, width, height):
+        self.cx, self.cy = x + width / 2, y + height / 2
+        self.hw, self.hh = abs(width) / 2, abs(height) / 2
+
+    def sdf(self, px, py):
+        dx = np.abs(px - self.cx) - self.hw
+        dy = np.abs(py - self.cy) - self.hh
+        outside = np.hypot(np.maximum(dx, 0), np.maximum(dy, 0))
+        inside = np.minimum(np.maximum(dx, dy), 0)
+        return outside + inside
+
+    def bounds(self):
+        return self.cx - self.hw, self.cy - self.hh, self.cx + self.hw, self.cy + self.hh
+
+
+class Ellipse(Shape):
+    def __init__(self, x, y, width, height):
+        self.cx, self.cy = x + width / 2, y + height / 2
+        self.rx, self.ry = max(abs(width) / 2, 1e-6), max(abs(height) / 2, 1e-6)
+
+    def sdf(self, px, py):
+        # First-order distance estimate f / |grad f|, accurate near the edge
+        nx = (px - self.cx) / self.rx
+        ny = (py - self.cy) / self.ry
+        f = nx * nx + ny * ny - 1
+        grad = 2 * np.hypot(nx / self.rx, ny / self.ry)
+        return np.where(grad > 1e-12, f / np.maximum(grad, 1e-12), -min(self.rx, self.ry))
+
+    def bound(self, px, py):
+        # (|p/r| - 1) * min(r) is 1-Lipschitz and zero exactly on the ellipse
+        n = np.hypot((px - self.cx) / self.rx, (py - self.cy) / self.ry)
+        return (n - 1) * min(self.rx, self.ry)
+
+    def bounds(self):
+        return self.cx - self.rx, self.cy - self.ry, self.cx + self.rx, self.cy + self.ry
+
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    """Unsigned distance from points to the segment a-b."""
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return np.hypot(px - ax, py - ay)
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / length_sq, 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+class Polygon(Shape):
+    def __init__(self, points):
+        self.points = [(float(p[0]), float(p[1])) for p in points]
+
+    def sdf(self, px, py):
+        distance = None
+        inside = np.zeros(np.broadcast(px, py).shape, dtype=bool)
+        n = len(self.points)
+        for i in range(n):
+            ax, ay = self.points[i]
+            bx, by = self.points[(i + 1) % n]
+            d = _segment_distance(px, py, ax, ay, bx, by)
+            distance = d if distance is None else np.minimum(distance, d)
+            # Even-odd rule: count edge crossings of a ray towards +x
+            if ay != by:
+                crosses = (ay > py) != (by > py)
+                x_at = ax + (py - ay) * (bx - ax) / (by - ay)
+                inside ^= crosses & (px < x_at)
+        return np.where(inside, -distance, distance)
+
+    def bounds(self):
+        xs = [p[0] for p in self.points]
+        ys = [p[1] for p in self.points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+
+class Line(Shape):
+    """A thick line segment with round caps, treated as a filled shape."""
+
+    def __init__(self, x1, y1, x2, y2, width):
+        self.a = (x1, y1)
+        self.b = (x2, y2)
+        self.half_width = max(width, 1) / 2
+
+    def sdf(self, px, py):
+        return _segment_distance(px, py, self.a[0], self.a[1], self.b[0], self.b[1]) - self.half_width
+
+    def bounds(self):
+        hw = self.half_width
+        return (min(self.a[0], self.b[0]) - hw, min(self.a[1], self.b[1]) - hw,
+                max(self.a[0], self.b[0]) + hw, max(self.a[1], self.b[1]) + hw)
+
+
+def _tile_coverage(distance, fill, stroke_width, antialias):
+    """Map signed distances to coverage in [0, 1]."""
+    if antialias:
+        # Coverage of a pixel by a half-plane at that distance, linearized
+        cover = np.clip(0.5 - distance, 0.0, 1.0) if fill else None
+        if stroke_width > 0:
+            outline = np.clip(stroke_width / 2 + 0.5 - np.abs(distance), 0.0, 1.0)
+            cover = outline if cover is None else np.maximum(cover, outline)
+    else:
+        cover = (distance <= 0) if fill else None
+        if stroke_width > 0:
+            outline = np.abs(distance) <= stroke_width / 2
+            cover = outline if cover is None else cover | outline
+        cover = cover.astype(np.float32)
+    return cover
+
+
+def shape_region(shape, canvas_width, canvas_height, stroke_width=0):
+    """Return the canvas-clipped integer (x, y, w, h) a shape can touch, or None."""
+    x1, y1, x2, y2 = shape.bounds()
+    margin = stroke_width / 2 + 1
+    left = max(0, int(math.floor(x1 - margin)))
+    top = max(0, int(math.floor(y1 - margin)))
+    right = min(canvas_width, int(math.ceil(x2 + margin)))
+    bottom = min(canvas_height, int(math.ceil(y2 + margin)))
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right - left, bottom - top
+
+
+def shape_tiles(shape, left, top, width, height, fill=True, stroke_width=0):
+    """
+    Yield (x, y, w, h, solid) for the tiles of the region (left, top,
+    width, height) that the shape or its outline may cover; x, y are
+    offsets within the region. solid tiles are fully inside a filled shape.
+    """
+    reach = stroke_width / 2 + 1  # Distance beyond the edge where coverage can be non-zero
+
+    for ty in range(0, height, TILE_SIZE):
+        th = min(TILE_SIZE, height - ty)
+        for tx in range(0, width, TILE_SIZE):
+            tw = min(TILE_SIZE, width - tx)
+
+            # Tile-level culling with the Lipschitz bound at the tile center
+            cx = left + tx + tw / 2
+            cy = top + ty + th / 2
+            radius = math.hypot(tw, th) / 2
+            d = float(shape.bound(np.float64(cx), np.float64(cy)))
+            if d > radius + reach:
+                continue  # Entirely outside the shape and its outline
+            if d < -(radius + reach):
+                # Entirely inside, away from the outline
+                if fill:
+                    yield tx, ty, tw, th, True
+                continue
+            yield tx, ty, tw, th, False
+
+
+def tile_coverage(shape, left, top, width, height, fill=True, stroke_width=0, antialias=True):
+    """Return the float32 coverage of one tile at canvas position (left, top); pixel centers sit at +0.5."""
+    xs = left + np.arange(width, dtype=np.float64) + 0.5
+    ys = top + np.arange(height, dtype=np.float64) + 0.5
+    distance = shape.sdf(xs[None, :], ys[:, None])
+    return _tile_coverage(distance, fill, stroke_width, antialias).astype(np.float32)
+
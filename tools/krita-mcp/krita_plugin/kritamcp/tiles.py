@@ -0,0 +1,69 @@
+"""
+Tiled pixel writes for the Krita MCP Bridge.
+Canvas-wide operations write fixed-size tiles from one reusable buffer
+instead of building a single width x height byte string, so peak memory
+is bounded by the tile size rather than the canvas size. Strokes are
+split the same way, touching only the tiles under the brush.
+"""
+
+TILE_SIZE = 1024  # Tile edge for canvas-wide writes; one tile buffer is TILE_SIZE^2 * 4 bytes
+RASTER_TILE_SIZE = 256  # Tile edge for strokes; only tiles under the brush are read and written
+
+
+def iter_tiles(x, y, width, height, tile_size=TILE_SIZE):
+    """Yield (x, y, width, height) tiles covering a rectangle, row by row."""
+    for ty in range(y, y + height, tile_size):
+        th = min(tile_size, y + height - ty)
+        for tx in range(x, x + width, tile_size):
+            yield tx, ty, min(tile_size, x + width - tx), th
+
+
+def fill_solid(layer, x, y, width, height, bgra, tile_size=TILE_SIZE):
+    """Fill a rectangle of a layer with one BGRA color, one tile at a time."""
+    tile_w, tile_h = min(width, tile_size), min(height, tile_size)
+    # A solid tile is the same row repeated; every smaller tile is a prefix of it
+    row = bytes(bgra) * tile_w
+    tile = row * tile_h
+    for tx, ty, tw, th in iter_tiles(x, y, width, height, tile_size):
+        data = tile if (tw, th) == (tile_w, tile_h) else tile[:tw * th * 4]
+        layer.setPixelData(data, tx, ty, tw, th)
+
+
+def group_by_tile(boxes, width, height, tile_size=RASTER_TILE_SIZE, merge_below=None):
+    """
+    Bucket (left, top, right, bottom) boxes by the canvas tiles they overlap.
+
+    Returns [((x, y, w, h), [box indices in input order]), ...] for the
+    non-empty tiles, clipped to a width x height canvas, in row order.
+    When the boxes' bounding box is no larger than the tiles they touch
+    (short or compact strokes) it is returned as the only tile instead,
+    unless it has at least merge_below pixels.
+    """
+    buckets = {}
+    inside = []
+    for i, (left, top, right, bottom) in enumerate(boxes):
+        left, top = max(0, left), max(0, top)
+        right, bottom = min(width, right), min(height, bottom)
+        if left >= right or top >= bottom:
+            continue
+        inside.append((i, left, top, right, bottom))
+        for row in range(top // tile_size, (bottom - 1) // tile_size + 1):
+            for col in range(left // tile_size, (right - 1) // tile_size + 1):
+                buckets.setdefault((row, col), []).append(i)
+    if not inside:
+        return []
+
+    grouped = []
+    for row, col in sorted(buckets):
+        x, y = col * tile_size, row * tile_size
+        rect = (x, y, min(tile_size, width - x), min(tile_size, height - y))
+        grouped.append((rect, buckets[row, col]))
+
+    left = min(box[1] for box in inside)
+    top = min(box[2] for box in inside)
+    right = max(box[3] for box in inside)
+    bottom = max(box[4] for box in inside)
+    area = (right - left) * (bottom - top)
+    if area <= sum(rect[2] * rect[3] for rect, _ in grouped) and (merge_below is None or area < merge_below):
+        return [((left, top, right - left, bottom - top), [box[0] for box in inside])]
+    return grouped
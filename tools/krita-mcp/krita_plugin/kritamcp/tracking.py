@@ -0,0 +1,80 @@
+"""
+Canvas change tracking for the Krita MCP Bridge.
+Records which fixed-size tiles of each document changed in which
+generation, so clients can fetch only what changed since they last looked.
+"""
+
+TILE_SIZE = 256  # Diff tile size in pixels
+
+
+def document_key(doc):
+    """Stable identity for a document (Python wrappers are recreated on every call)."""
+    return doc.rootNode().uniqueId().toString()
+
+
+class ChangeTracker:
+    """Per-document map of tile -> generation in which the tile last changed."""
+
+    def __init__(self, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        # Generations are global: a generation only describes a snapshot
+        # together with the document it was taken from, so callers must check
+        # the document before trusting `since` (see cmd_get_canvas_diff)
+        self.generation = 0
+        self.documents = {}
+
+    def _document(self, key):
+        state = self.documents.get(key)
+        if state is None:
+            # A document we haven't seen is entirely new to every client
+            self.generation += 1
+            state = {"reset": self.generation, "modified": self.generation, "tiles": {}}
+            self.documents[key] = state
+        return state
+
+    def mark(self, key, x, y, width, height):
+        """Record a changed rectangle and return the new generation."""
+        state = self._document(key)
+        self.generation += 1
+        size = self.tile_size
+        tiles = state["tiles"]
+        for ty in range(max(0, y) // size, max(0, y + height - 1) // size + 1):
+            for tx in range(max(0, x) // size, max(0, x + width - 1) // size + 1):
+                tiles[(tx, ty)] = self.generation
+        state["modified"] = self.generation
+        return self.generation
+
+    def mark_all(self, key):
+        """Record that the whole document changed (clear, resize, undo...)."""
+        state = self._document(key)
+        self.generation += 1
+        state["reset"] = self.generation
+        state["modified"] = self.generation
+        state["tiles"].clear()
+        return self.generation
+
+    def modified_generation(self, key):
+        """Return the generation of the document's most recent change."""
+        return self._document(key)["modified"]
+
+    def changed_tiles(self, key, since, width, height):
+        """Return (x, y, w, h) rectangles of tiles changed after generation `since`."""
+        state = self._document(key)
+        size = self.tile_size
+        cols = (width + size - 1) // size
+        rows = (height + size - 1) // size
+
+        if since < state["reset"]:
+            coords = [(tx, ty) for ty in range(rows) for tx in range(cols)]
+        else:
+            coords = sorted(
+                (tile for tile, generation in state["tiles"].items() if generation > since),
+                key=lambda tile: (tile[1], tile[0])
+            )
+
+        rects = []
+        for tx, ty in coords:
+            x, y = tx * size, ty * size
+            if x < width and y < height:
+                rects.append((x, y, min(size, width - x), min(size, height - y)))
+        return rects
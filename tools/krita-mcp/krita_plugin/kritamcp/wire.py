@@ -0,0 +1,67 @@
+"""
+Binary point encoding for the Krita MCP Bridge.
+Large strokes can be posted as packed little-endian arrays instead of
+JSON lists of lists, and decoded straight into NumPy arrays:
+
+    magic     4 bytes   b"KMCP"
+    version   uint8     1
+    flags     uint8     FLAG_FLOAT32 | FLAG_PRESSURE
+    count     uint32    number of points
+    json_len  uint32    length of the JSON command that follows
+    command   json_len bytes of UTF-8 JSON ({"action", "params", "timeout"})
+    points    count * 2 values, x y interleaved: int16, or float32 with FLAG_FLOAT32
+    pressure  count float32 values, only with FLAG_PRESSURE
+
+The arrays are stored into params["points"] (and params["pressure"]).
+Only actions in ARRAY_ACTIONS accept them; their handlers must not test
+points or pressure for truthiness.
+"""
+
+import json
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # Krita's bundled Python does not always ship NumPy
+    np = None
+
+POINTS_CONTENT_TYPE = "application/x-kritamcp-points"
+MAGIC = b"KMCP"
+VERSION = 1
+FLAG_FLOAT32 = 1
+FLAG_PRESSURE = 2
+HEADER = struct.Struct("<4sBBII")
+
+# Commands whose handlers take params["points"] as a NumPy array
+ARRAY_ACTIONS = ("stroke", "curve_stroke", "draw_shape", "sample")
+
+
+def decode_points_command(body):
+    """Decode a binary point payload into a command dict; raises ValueError if malformed."""
+    if len(body) < HEADER.size:
+        raise ValueError("Truncated header")
+    magic, version, flags, count, json_len = HEADER.unpack_from(body)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a KMCP v1 payload")
+
+    offset = HEADER.size
+    command = json.loads(body[offset:offset + json_len].decode("utf-8"))
+    if not isinstance(command, dict):
+        raise ValueError("Command must be a JSON object")
+    if command.get("action") not in ARRAY_ACTIONS:
+        raise ValueError(f"Action {command.get('action')!r} does not take binary points")
+    offset += json_len
+
+    dtype = np.dtype("<f4") if flags & FLAG_FLOAT32 else np.dtype("<i2")
+    size = count * 2 * dtype.itemsize
+    pressure_size = count * 4 if flags & FLAG_PRESSURE else 0
+    if len(body) != offset + size + pressure_size:
+        raise ValueError("Payload size does not match the header")
+
+    params = command.setdefault("params", {})
+    if not isinstance(params, dict):
+        raise ValueError("params must be a JSON object")
+    params["points"] = np.frombuffer(body, dtype=dtype, count=count * 2, offset=offset).reshape(count, 2)
+    if flags & FLAG_PRESSURE:
+        params["pressure"] = np.frombuffer(body, dtype="<f4", count=count, offset=offset + size)
+    return command
@@ -0,0 +1,80 @@
+"""
+Raster worker pool for the Krita MCP Bridge.
+Large strokes, fills and shapes are split into independent row bands or
+tiles and run on a small thread pool. The kernels are NumPy array
+operations that release the GIL, so they use several cores. Krita API
+calls (pixelData/setPixelData) stay on the calling thread, which is
+Krita's main thread.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import threading
+
+WORKER_THREADS = min(8, os.cpu_count() or 1)  # Raster threads; 1 keeps everything on the main thread
+PARALLEL_MIN_PIXELS = 512 * 512               # Jobs smaller than this run on the calling thread
+
+_THREAD_PREFIX = "kritamcp-raster"
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """Return the shared executor, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix=_THREAD_PREFIX)
+        return _pool
+
+
+def parallel(pixels):
+    """Whether a job of this many pixels should be split across workers."""
+    if WORKER_THREADS <= 1 or pixels < PARALLEL_MIN_PIXELS:
+        return False
+    # Work submitted from a worker runs inline; waiting on the pool from
+    # inside it could deadlock
+    return not threading.current_thread().name.startswith(_THREAD_PREFIX)
+
+
+def run_bands(height, width, fn, align=1):
+    """
+    Call fn(y0, y1) over row bands covering [0, height).
+
+    Large jobs are split into about two bands per worker, each a multiple
+    of `align` rows, and run concurrently; fn must only touch its own rows.
+    """
+    if not parallel(height * width):
+        fn(0, height)
+        return
+    band = math.ceil(height / (2 * WORKER_THREADS) / align) * align
+    futures = [pool().submit(fn, y, min(height, y + band)) for y in range(0, height, band)]
+    for future in futures:
+        future.result()
+
+
+def map_tiles(rects, read, work, write):
+    """
+    For each (x, y, w, h) rect: data = read(rect), result = work(rect, data),
+    then write(rect, result).
+
+    read and write always run on the calling thread, in order. work runs on
+    the pool when the rects add up to a large job, with a bounded number of
+    tiles in flight.
+    """
+    if not parallel(sum(rect[2] * rect[3] for rect in rects)):
+        for rect in rects:
+            write(rect, work(rect, read(rect)))
+        return
+
+    in_flight = deque()
+    for rect in rects:
+        in_flight.append((rect, pool().submit(work, rect, read(rect))))
+        if len(in_flight) >= 2 * WORKER_THREADS:
+            done, future = in_flight.popleft()
+            write(done, future.result())
+    while in_flight:
+        done, future = in_flight.popleft()
+        write(done, future.result())
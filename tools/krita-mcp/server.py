@@ -4,27 +4,130 @@ Bridge between Claude and Krita painting plugin.
 """
 
 from fastmcp import FastMCP
+from fastmcp.utilities.types import Image
+import asyncio
+import base64
 import httpx
+import json
 import os
-from typing import Optional
+import struct
+from typing import Optional, Union
 
 # Configuration
 KRITA_URL = os.environ.get("KRITA_URL", "http://localhost:5678")
+COMMAND_TIMEOUT = float(os.environ.get("KRITA_COMMAND_TIMEOUT", "25"))
+MAX_CONCURRENT_COMMANDS = int(os.environ.get("KRITA_MAX_CONCURRENT_COMMANDS", "4"))
+EXPORT_TIMEOUT = float(os.environ.get("KRITA_EXPORT_TIMEOUT", "120"))
+BINARY_POINTS_THRESHOLD = int(os.environ.get("KRITA_BINARY_POINTS_THRESHOLD", "256"))
 
-mcp = FastMCP("krita-mcp")
+# Packed point payloads (see krita_plugin/kritamcp/wire.py for the layout)
+POINTS_CONTENT_TYPE = "application/x-kritamcp-points"
+POINTS_HEADER = struct.Struct("<4sBBII")
+FLAG_FLOAT32 = 1
+FLAG_PRESSURE = 2
 
+mcp = FastMCP("krita-mcp")
 
-def send_command(action: str, params: dict = None) -> dict:
+# One pooled client for the whole session, so commands reuse open connections
+client = httpx.AsyncClient(
+    base_url=KRITA_URL,
+    timeout=COMMAND_TIMEOUT + 5.0,
+    limits=httpx.Limits(max_connections=8, max_keepalive_connections=8)
+)
+
+# Commands run one at a time on Krita's main thread anyway; bound how many we
+# keep in flight so a burst of tool calls can't pile up behind a slow export
+command_slots = asyncio.Semaphore(MAX_CONCURRENT_COMMANDS)
+
+
+# Request body formats the plugin accepts besides JSON, and the actions that
+# take packed points, learned from /info
+plugin_content_types = None
+plugin_binary_actions = ()
+
+
+async def accepts_binary_points(action: str) -> bool:
+    """Check (once) whether the plugin decodes packed point payloads for an action."""
+    global plugin_content_types, plugin_binary_actions
+    if plugin_content_types is None:
+        try:
+            response = await client.get("/info", timeout=5.0)
+            info = response.json()
+        except Exception:
+            return False
+        plugin_content_types = info.get("content_types", [])
+        # Plugins that predate the list only decoded points for strokes safely
+        plugin_binary_actions = tuple(info.get("binary_point_actions", ["stroke"]))
+    return POINTS_CONTENT_TYPE in plugin_content_types and action in plugin_binary_actions
+
+
+def encode_points_command(command: dict) -> Optional[bytes]:
+    """Pack a command's points (and per-point pressure) as binary, or None if they don't fit the format."""
+    params = dict(command["params"])
+    points = params.pop("points")
+    dims = {len(p) for p in points}
+    if len(dims) != 1 or dims.pop() not in (2, 3):
+        return None
+
+    pressure = params.get("pressure")
+    if isinstance(pressure, list):
+        if len(pressure) != len(points):
+            return None
+        del params["pressure"]
+    elif len(points[0]) == 3:
+        pressure = [p[2] for p in points]
+    else:
+        pressure = None
+
+    coords = [c for p in points for c in p[:2]]
+    # Tool arguments arrive as floats (list[list[float]]), so whole numbers count as ints
+    if all(isinstance(c, (int, float)) and float(c).is_integer() and -32768 <= c <= 32767 for c in coords):
+        flags, packed = 0, struct.pack(f"<{len(coords)}h", *(int(c) for c in coords))
+    else:
+        flags, packed = FLAG_FLOAT32, struct.pack(f"<{len(coords)}f", *coords)
+    if pressure is not None:
+        flags |= FLAG_PRESSURE
+        packed += struct.pack(f"<{len(pressure)}f", *pressure)
+
+    header_json = json.dumps(dict(command, params=params)).encode()
+    return POINTS_HEADER.pack(b"KMCP", 1, flags, len(points), len(header_json)) + header_json + packed
+
+
+async def send_command(action: str, params: dict = None, timeout: float = COMMAND_TIMEOUT) -> dict:
     """Send command to Krita plugin and return result."""
     if params is None:
         params = {}
+    command = {"action": action, "params": params, "timeout": timeout}
+
+    try:
+        # Large point lists go over the wire packed instead of as JSON
+        body = None
+        points = params.get("points")
+        if (isinstance(points, list) and len(points) >= BINARY_POINTS_THRESHOLD
+                and await accepts_binary_points(action)):
+            body = encode_points_command(command)
+
+        async with command_slots:
+            if body is not None:
+                response = await client.post(
+                    "/",
+                    content=body,
+                    headers={"Content-Type": POINTS_CONTENT_TYPE},
+                    timeout=timeout + 5.0
+                )
+            else:
+                response = await client.post("/", json=command, timeout=timeout + 5.0)
+        return response.json()
+    except httpx.ConnectError:
+        return {"error": "Cannot connect to Krita. Is Krita running with the MCP plugin enabled?"}
+    except Exception as e:
+        return {"error": str(e)}
 
+
+async def export_status(job: int, wait: float = 0) -> dict:
+    """Fetch a background export's state from the plugin, optionally waiting for it to finish."""
     try:
-        response = httpx.post(
-            KRITA_URL,
-            json={"action": action, "params": params},
-            timeout=30.0
-        )
+        response = await client.get(f"/export/{job}", params={"wait": wait}, timeout=wait + 5.0)
         return response.json()
     except httpx.ConnectError:
         return {"error": "Cannot connect to Krita. Is Krita running with the MCP plugin enabled?"}
@@ -32,11 +135,20 @@ def send_command(action: str, params: dict = None) -> dict:
         return {"error": str(e)}
 
 
+def describe_export(info: dict) -> str:
+    """One-line summary of an export job's state."""
+    if "error" in info:
+        return f"Error: {info['error']}"
+    if info.get("state") == "done":
+        return f"Export job {info['job']} done: {info['path']} ({info.get('bytes', 0)} bytes, {info.get('seconds', 0)}s)"
+    return f"Export job {info['job']} {info.get('state')}: {info['path']}"
+
+
 @mcp.tool()
-def krita_health() -> str:
+async def krita_health() -> str:
     """Check if Krita is running and the MCP plugin is active."""
     try:
-        response = httpx.get(f"{KRITA_URL}/health", timeout=5.0)
+        response = await client.get("/health", timeout=5.0)
         data = response.json()
         return f"Krita is running. Plugin: {data.get('plugin', 'unknown')}"
     except:
@@ -44,7 +156,44 @@ def krita_health() -> str:
 
 
 @mcp.tool()
-def krita_new_canvas(
+async def krita_stats() -> str:
+    """
+    Summarize the plugin's per-command latency: queue wait, execute, refresh and
+    encode times (mean / p50 / p95 / max in ms), error and timeout counts, and
+    the current queue depth. Full histograms are at GET /metrics on the plugin.
+    """
+    try:
+        response = await client.get("/stats", timeout=5.0)
+        data = response.json()
+    except httpx.ConnectError:
+        return "Cannot connect to Krita. Is Krita running with the MCP plugin enabled?"
+    except Exception as e:
+        return f"Error: {e}"
+
+    if "error" in data:
+        return f"Error: {data['error']}"
+
+    lines = [f"Uptime {data.get('uptime', 0)}s, queue depth {data.get('queue_depth', 0)}"]
+    actions = data.get("actions", {})
+    for action in sorted(actions, key=lambda a: -actions[a].get("execute", {}).get("count", 0)):
+        stats = actions[action]
+        lines.append(f"{action}: {stats['ok']} ok, {stats['error']} errors, {stats['timeouts']} timeouts")
+        for phase in ("queue_wait", "execute", "refresh", "encode"):
+            if phase in stats:
+                p = stats[phase]
+                lines.append(
+                    f"  {phase}: n={p['count']} mean {p['mean_ms']}ms, p50 {p['p50_ms']}ms, "
+                    f"p95 {p['p95_ms']}ms, max {p['max_ms']}ms"
+                )
+
+    cache = data.get("stamp_cache")
+    if cache:
+        lines.append(f"Stamp cache: {cache['hits']} hits, {cache['misses']} misses, {cache['size']} stamps")
+    return "\n".join(lines)
+
+
+@mcp.tool()
+async def krita_new_canvas(
     width: int = 800,
     height: int = 600,
     name: str = "New Canvas",
@@ -59,7 +208,7 @@ def krita_new_canvas(
         name: Document name
         background: Background color as hex (default dark blue)
     """
-    result = send_command("new_canvas", {
+    result = await send_command("new_canvas", {
         "width": width,
         "height": height,
         "name": name,
@@ -72,14 +221,14 @@ def krita_new_canvas(
 
 
 @mcp.tool()
-def krita_set_color(color: str) -> str:
+async def krita_set_color(color: str) -> str:
     """
     Set the foreground (paint) color.
 
     Args:
         color: Hex color code (e.g., "#ff6b6b", "#b8a9c9")
     """
-    result = send_command("set_color", {"color": color})
+    result = await send_command("set_color", {"color": color})
 
     if "error" in result:
         return f"Error: {result['error']}"
@@ -87,7 +236,7 @@ def krita_set_color(color: str) -> str:
 
 
 @mcp.tool()
-def krita_set_brush(
+async def krita_set_brush(
     preset: Optional[str] = None,
     size: Optional[int] = None,
     opacity: Optional[float] = None
@@ -96,7 +245,7 @@ def krita_set_brush(
     Set brush preset and properties.
 
     Args:
-        preset: Brush preset name (partial match, e.g., "Basic", "Soft", "Airbrush")
+        preset: Brush preset name (partial or approximate match, e.g., "Basic", "Soft", "Airbrush")
         size: Brush size in pixels
         opacity: Brush opacity (0.0 to 1.0)
     """
@@ -108,69 +257,167 @@ def krita_set_brush(
     if opacity is not None:
         params["opacity"] = opacity
 
-    result = send_command("set_brush", params)
+    result = await send_command("set_brush", params)
 
     if "error" in result:
         return f"Error: {result['error']}"
-    return f"Brush set: preset={preset}, size={size}, opacity={opacity}"
+    return f"Brush set: preset={result.get('preset')}, size={size}, opacity={opacity}"
 
 
 @mcp.tool()
-def krita_stroke(points: list[list[int]], pressure: float = 1.0) -> str:
+async def krita_stroke(
+    points: list[list[float]],
+    pressure: Union[float, list[float]] = 1.0,
+    blend_mode: str = "normal",
+    size_curve: Optional[list[list[float]]] = None,
+    opacity_curve: Optional[list[list[float]]] = None
+) -> str:
     """
     Paint a stroke through a series of points.
 
     Args:
-        points: List of [x, y] coordinate pairs, e.g., [[100, 100], [150, 120], [200, 150]]
-        pressure: Brush pressure (0.0 to 1.0, affects stroke thickness/opacity)
+        points: List of [x, y] coordinate pairs, e.g., [[100, 100], [150, 120], [200, 150]].
+            Points may also be [x, y, pressure] triples.
+        pressure: Brush pressure (0.0 to 1.0), either one value for the whole stroke
+            or one value per point
+        blend_mode: "normal", "multiply", "screen", "overlay", "darken", "lighten" or "erase"
+        size_curve: [pressure, size factor] control points mapping pressure to brush size,
+            e.g. [[0, 0.2], [1, 1]] (default: size proportional to pressure)
+        opacity_curve: [pressure, opacity factor] control points mapping pressure to opacity
+            (default: opacity proportional to pressure)
     """
     if len(points) < 2:
         return "Error: Need at least 2 points for a stroke"
 
-    result = send_command("stroke", {
+    params = {
         "points": points,
-        "pressure": pressure
-    })
+        "pressure": pressure,
+        "blend_mode": blend_mode
+    }
+    if size_curve is not None:
+        params["size_curve"] = size_curve
+    if opacity_curve is not None:
+        params["opacity_curve"] = opacity_curve
+
+    result = await send_command("stroke", params)
 
     if "error" in result:
         return f"Error: {result['error']}"
-    return f"Stroke painted with {len(points)} points"
+    return f"Stroke painted with {len(points)} points ({result.get('dabs', 0)} dabs)"
 
 
 @mcp.tool()
-def krita_fill(x: int, y: int, radius: int = 50) -> str:
+async def krita_curve_stroke(
+    points: list[list[float]],
+    curve: str = "catmull_rom",
+    pressure: Optional[Union[float, list[float]]] = None,
+    blend_mode: str = "normal",
+    size_curve: Optional[list[list[float]]] = None,
+    opacity_curve: Optional[list[list[float]]] = None
+) -> str:
     """
-    Fill an area with current color (paints a filled circle at the point).
+    Paint a smooth stroke along a curve defined by a few control points.
 
     Args:
-        x: X coordinate
-        y: Y coordinate
-        radius: Fill radius in pixels
+        points: Control points as [x, y] pairs (or [x, y, pressure] triples).
+            For "catmull_rom" the curve passes through every point.
+            For "bezier" give anchor, control, control, anchor, ... (3n+1 points).
+        curve: "catmull_rom" or "bezier"
+        pressure: Brush pressure (0.0 to 1.0), one value for the whole stroke or one per
+            control point (interpolated along the curve)
+        blend_mode: "normal", "multiply", "screen", "overlay", "darken", "lighten" or "erase"
+        size_curve: [pressure, size factor] control points mapping pressure to brush size
+        opacity_curve: [pressure, opacity factor] control points mapping pressure to opacity
     """
-    result = send_command("fill", {"x": x, "y": y, "radius": radius})
+    params = {
+        "points": points,
+        "curve": curve,
+        "blend_mode": blend_mode
+    }
+    if pressure is not None:
+        params["pressure"] = pressure
+    if size_curve is not None:
+        params["size_curve"] = size_curve
+    if opacity_curve is not None:
+        params["opacity_curve"] = opacity_curve
+
+    result = await send_command("curve_stroke", params)
 
     if "error" in result:
         return f"Error: {result['error']}"
-    return f"Filled at ({x}, {y}) with radius {radius}"
+    return f"Curve painted through {len(points)} control points ({result.get('dabs', 0)} dabs)"
 
 
 @mcp.tool()
-def krita_draw_shape(
-    shape: str,
+async def krita_fill(
     x: int,
     y: int,
+    tolerance: int = 32,
+    mode: str = "contiguous",
+    sample_merged: bool = False,
+    opacity: float = 1.0,
+    radius: Optional[int] = None,
+    blend_mode: str = "normal"
+) -> str:
+    """
+    Bucket fill with the current color, starting at a point.
+
+    Args:
+        x: X coordinate of the seed pixel
+        y: Y coordinate of the seed pixel
+        tolerance: How different a pixel may be from the seed color and still be filled
+            (0-255, largest per-channel difference)
+        mode: "contiguous" fills the connected area around the seed,
+            "global" fills every matching pixel on the layer
+        sample_merged: Match colors against the visible image instead of the active layer
+        opacity: Fill opacity (0.0 to 1.0)
+        radius: If given, paint a filled circle of this radius at the point instead
+        blend_mode: "normal", "multiply", "screen", "overlay", "darken", "lighten" or "erase"
+    """
+    if radius is not None:
+        result = await send_command("fill", {"x": x, "y": y, "radius": radius, "blend_mode": blend_mode})
+
+        if "error" in result:
+            return f"Error: {result['error']}"
+        return f"Filled at ({x}, {y}) with radius {radius}"
+
+    result = await send_command("fill", {
+        "x": x,
+        "y": y,
+        "tolerance": tolerance,
+        "mode": mode,
+        "sample_merged": sample_merged,
+        "opacity": opacity,
+        "blend_mode": blend_mode
+    })
+
+    if "error" in result:
+        return f"Error: {result['error']}"
+    return f"Filled {result.get('pixels', 0)} pixels from ({x}, {y}) ({mode})"
+
+
+@mcp.tool()
+async def krita_draw_shape(
+    shape: str,
+    x: int = 0,
+    y: int = 0,
     width: int = 100,
     height: int = 100,
     fill: bool = True,
     stroke: bool = False,
     x2: Optional[int] = None,
-    y2: Optional[int] = None
+    y2: Optional[int] = None,
+    points: Optional[list[list[float]]] = None,
+    line_width: int = 2,
+    antialias: bool = True,
+    opacity: float = 1.0,
+    blend_mode: str = "normal"
 ) -> str:
     """
-    Draw a shape on the canvas.
+    Draw an anti-aliased shape on the canvas.
 
     Args:
-        shape: Type of shape - "rectangle", "ellipse", or "line"
+        shape: Type of shape - "rectangle", "ellipse", "polygon", or "line"
         x: X coordinate (top-left for shapes, start point for lines)
         y: Y coordinate (top-left for shapes, start point for lines)
         width: Width of shape (ignored for lines if x2/y2 provided)
@@ -179,6 +426,11 @@ def krita_draw_shape(
         stroke: Whether to draw outline
         x2: End X for lines (optional)
         y2: End Y for lines (optional)
+        points: Polygon vertices as [x, y] pairs (polygon only)
+        line_width: Outline width, or thickness for lines
+        antialias: Smooth edges (False gives hard pixel edges)
+        opacity: Shape opacity (0.0 to 1.0)
+        blend_mode: "normal", "multiply", "screen", "overlay", "darken", "lighten" or "erase"
     """
     params = {
         "shape": shape,
@@ -187,42 +439,145 @@ def krita_draw_shape(
         "width": width,
         "height": height,
         "fill": fill,
-        "stroke": stroke
+        "stroke": stroke,
+        "line_width": line_width,
+        "antialias": antialias,
+        "opacity": opacity,
+        "blend_mode": blend_mode
     }
     if x2 is not None:
         params["x2"] = x2
     if y2 is not None:
         params["y2"] = y2
+    if points is not None:
+        params["points"] = points
 
-    result = send_command("draw_shape", params)
+    result = await send_command("draw_shape", params)
 
     if "error" in result:
         return f"Error: {result['error']}"
+    if shape == "polygon" and points:
+        return f"Drew polygon with {len(points)} points"
     return f"Drew {shape} at ({x}, {y})"
 
 
 @mcp.tool()
-def krita_get_canvas(filename: str = "canvas.png") -> str:
+async def krita_get_canvas(
+    filename: str = "canvas.png",
+    preview: bool = False,
+    max_size: int = 1024,
+    format: str = "png",
+    quality: int = 85,
+    compression: int = 6,
+    background: bool = False,
+    cache: bool = True
+) -> str | Image:
     """
-    Export current canvas to a PNG file and return the path.
+    Export current canvas to an image file and return the path.
     Use this to see your painting progress.
 
+    With preview=True the canvas is downscaled and returned inline as an image
+    instead, which is much faster than writing and re-reading a full-size file.
+
+    The file is encoded and written in the background, so Krita keeps taking
+    commands meanwhile. With background=True this returns a job ID right away;
+    check it with krita_export_status or krita_wait_export.
+
     Args:
         filename: Output filename (saved to configured output directory)
+        preview: Return a downscaled image inline instead of a file path
+        max_size: Longest side of the preview in pixels
+        format: Encoding - "png", "jpeg" or "webp"
+        quality: Quality for jpeg/webp (0-100)
+        compression: PNG compression level (0 = fastest, 9 = smallest)
+        background: Return the export job ID without waiting for the file
+        cache: Reuse an earlier export or preview if the canvas hasn't changed
+    """
+    if preview:
+        result = await send_command("get_canvas", {
+            "preview": True,
+            "max_size": max_size,
+            "format": format,
+            "quality": quality,
+            "cache": cache
+        })
+
+        if "error" in result:
+            return f"Error: {result['error']}"
+        return Image(data=base64.b64decode(result["data"]), format=result["format"])
+
+    result = await send_command("get_canvas", {
+        "filename": filename,
+        "format": format,
+        "quality": quality,
+        "compression": compression,
+        "cache": cache
+    })
+
+    if "error" in result:
+        return f"Error: {result['error']}"
+    if "job" not in result:
+        return f"Canvas saved to: {result['path']}"
+    if background:
+        return f"Export job {result['job']} started: {result['path']}"
+
+    info = await export_status(result["job"], EXPORT_TIMEOUT)
+    if "error" in info:
+        return f"Error: {info['error']}"
+    if info.get("state") != "done":
+        return f"Export job {result['job']} still {info.get('state')}; check it with krita_wait_export"
+    if result.get("cached"):
+        return f"Canvas unchanged since the last export: {info['path']}"
+    return f"Canvas saved to: {info['path']}"
+
+
+@mcp.tool()
+async def krita_get_canvas_diff(
+    since: int = 0,
+    document: Optional[str] = None,
+    format: str = "png",
+    quality: int = 85
+) -> str | list[str | Image]:
     """
-    result = send_command("get_canvas", {"filename": filename})
+    Return only the parts of the canvas that changed since an earlier call.
+    Cheaper than krita_get_canvas when you've only touched a small area.
+
+    Changed areas come back as image tiles, each preceded by its position on
+    the canvas. The first line gives the generation and document to pass as
+    `since` and `document` next time; if the active document has changed since
+    then, the whole canvas is returned.
+
+    Args:
+        since: Generation returned by a previous call (0 returns the whole canvas)
+        document: Document ID returned by the same previous call
+        format: Tile encoding - "png", "jpeg" or "webp"
+        quality: Quality for jpeg/webp (0-100)
+    """
+    params = {"since": since, "format": format, "quality": quality}
+    if document:
+        params["document"] = document
+    result = await send_command("get_canvas_diff", params)
 
     if "error" in result:
         return f"Error: {result['error']}"
 
-    path = result.get("path", "")
-    return f"Canvas saved to: {path}"
+    tiles = result.get("tiles", [])
+    generation = result.get("generation")
+    content = [
+        f"Generation {generation}: {len(tiles)} changed tile(s) on a "
+        f"{result.get('width')}x{result.get('height')} canvas. "
+        f"Pass since={generation}, document=\"{result.get('document')}\" next time."
+    ]
+    for tile in tiles:
+        content.append(f"Tile at ({tile['x']}, {tile['y']}), {tile['width']}x{tile['height']}:")
+        content.append(Image(data=base64.b64decode(tile["data"]), format=result["format"]))
+    return content
 
 
 @mcp.tool()
-def krita_undo() -> str:
+async def krita_undo() -> str:
     """Undo the last action."""
-    result = send_command("undo", {})
+    result = await send_command("undo", {})
 
     if "error" in result:
         return f"Error: {result['error']}"
@@ -230,9 +585,9 @@ def krita_undo() -> str:
 
 
 @mcp.tool()
-def krita_redo() -> str:
+async def krita_redo() -> str:
     """Redo the last undone action."""
-    result = send_command("redo", {})
+    result = await send_command("redo", {})
 
     if "error" in result:
         return f"Error: {result['error']}"
@@ -240,14 +595,14 @@ def krita_redo() -> str:
 
 
 @mcp.tool()
-def krita_clear(color: str = "#1a1a2e") -> str:
+async def krita_clear(color: str = "#1a1a2e") -> str:
     """
     Clear the canvas to a solid color.
 
     Args:
         color: Color to fill canvas with (default dark blue)
     """
-    result = send_command("clear", {"color": color})
+    result = await send_command("clear", {"color": color})
 
     if "error" in result:
         return f"Error: {result['error']}"
@@ -255,22 +610,70 @@ def krita_clear(color: str = "#1a1a2e") -> str:
 
 
 @mcp.tool()
-def krita_save(path: str) -> str:
+async def krita_save(
+    path: str,
+    quality: int = 90,
+    compression: int = 6,
+    background: bool = False,
+    cache: bool = True
+) -> str:
     """
     Save the current canvas to a specific file path.
 
+    PNG, JPEG and WebP files are written in the background; other formats
+    (e.g. .kra, .psd) are exported by Krita directly.
+
     Args:
         path: Full file path to save to (e.g., "C:/art/my_painting.png")
+        quality: Quality for jpeg/webp (0-100)
+        compression: PNG compression level (0 = fastest, 9 = smallest)
+        background: Return the export job ID without waiting for the file
+        cache: Reuse an earlier export of this file if the canvas hasn't changed
     """
-    result = send_command("save", {"path": path})
+    result = await send_command("save", {
+        "path": path, "quality": quality, "compression": compression, "cache": cache
+    })
 
     if "error" in result:
         return f"Error: {result['error']}"
+    if "job" not in result:
+        return f"Saved to {path}"
+    if background:
+        return f"Export job {result['job']} started: {path}"
+
+    info = await export_status(result["job"], EXPORT_TIMEOUT)
+    if "error" in info:
+        return f"Error: {info['error']}"
+    if info.get("state") != "done":
+        return f"Export job {result['job']} still {info.get('state')}; check it with krita_wait_export"
     return f"Saved to {path}"
 
 
 @mcp.tool()
-def krita_get_color_at(x: int, y: int) -> str:
+async def krita_export_status(job: int) -> str:
+    """
+    Check on a background export started by krita_get_canvas or krita_save.
+
+    Args:
+        job: Export job ID
+    """
+    return describe_export(await export_status(job))
+
+
+@mcp.tool()
+async def krita_wait_export(job: int, timeout: float = 60) -> str:
+    """
+    Wait for a background export to finish.
+
+    Args:
+        job: Export job ID
+        timeout: Maximum seconds to wait
+    """
+    return describe_export(await export_status(job, timeout))
+
+
+@mcp.tool()
+async def krita_get_color_at(x: int, y: int) -> str:
     """
     Sample the color at a specific pixel (eyedropper).
 
@@ -278,7 +681,7 @@ def krita_get_color_at(x: int, y: int) -> str:
         x: X coordinate
         y: Y coordinate
     """
-    result = send_command("get_color_at", {"x": x, "y": y})
+    result = await send_command("get_color_at", {"x": x, "y": y})
 
     if "error" in result:
         return f"Error: {result['error']}"
@@ -286,15 +689,62 @@ def krita_get_color_at(x: int, y: int) -> str:
 
 
 @mcp.tool()
-def krita_list_brushes(filter: str = "", limit: int = 20) -> str:
+async def krita_sample(
+    points: Optional[list[list[int]]] = None,
+    rect: Optional[list[int]] = None,
+    palette_size: int = 5
+) -> str:
     """
-    List available brush presets.
+    Sample many pixels and/or summarize a region in one call.
+    Much faster than calling krita_get_color_at repeatedly.
+
+    Args:
+        points: List of [x, y] pixels to read, e.g. [[10, 10], [200, 150]]
+        rect: Region [x, y, width, height] to compute mean/median color,
+            alpha coverage and a dominant-color palette for
+        palette_size: Number of dominant colors to report for the region (0-32)
+    """
+    params = {"palette_size": palette_size}
+    if points:
+        params["points"] = points
+    if rect:
+        params["rect"] = rect
+
+    result = await send_command("sample", params)
+
+    if "error" in result:
+        return f"Error: {result['error']}"
+
+    lines = []
+    for point, color in zip(points or [], result.get("colors", [])):
+        if color is None:
+            lines.append(f"({point[0]}, {point[1]}): outside canvas")
+        else:
+            lines.append(f"({point[0]}, {point[1]}): {color['color']} (A:{color['a']})")
+
+    stats = result.get("stats")
+    if stats:
+        x, y, w, h = result["rect"]
+        lines.append(f"Region ({x}, {y}) {w}x{h}: coverage {stats['coverage']:.1%}")
+        if stats["mean"]:
+            lines.append(f"  Mean: {stats['mean']['color']}  Median: {stats['median']['color']}")
+            palette = ", ".join(f"{c['color']} ({c['fraction']:.0%})" for c in stats["palette"])
+            lines.append(f"  Palette: {palette}")
+
+    return "\n".join(lines)
+
+
+@mcp.tool()
+async def krita_list_brushes(filter: str = "", limit: int = 20, fuzzy: bool = False) -> str:
+    """
+    List available brush presets, best matches first.
 
     Args:
         filter: Filter brushes by name (partial match)
         limit: Maximum number to return
+        fuzzy: Also include close misspellings of the filter
     """
-    result = send_command("list_brushes", {"filter": filter, "limit": limit})
+    result = await send_command("list_brushes", {"filter": filter, "limit": limit, "fuzzy": fuzzy})
 
     if "error" in result:
         return f"Error: {result['error']}"
@@ -306,5 +756,38 @@ def krita_list_brushes(filter: str = "", limit: int = 20) -> str:
     return f"Available brushes ({len(brushes)}):\n" + "\n".join(f"  - {b}" for b in brushes)
 
 
+@mcp.tool()
+async def krita_batch(commands: list[dict], stop_on_error: bool = False, timeout: float = 120.0) -> str:
+    """
+    Run several commands in one request, in order, with a single canvas refresh.
+    Much faster than calling the individual tools one by one for many strokes.
+
+    Args:
+        commands: List of {"action": ..., "params": {...}} objects, e.g.
+            [{"action": "set_color", "params": {"color": "#ff6b6b"}},
+             {"action": "stroke", "params": {"points": [[10, 10], [200, 120]]}}]
+            Actions match the plugin commands: new_canvas, set_color, set_brush,
+            stroke, fill, draw_shape, get_canvas, undo, redo, clear, save,
+            get_color_at, list_brushes
+        stop_on_error: Stop at the first failing command instead of running the rest
+        timeout: Seconds to wait for the whole batch to finish
+    """
+    result = await send_command("batch", {"commands": commands, "stop_on_error": stop_on_error}, timeout=timeout)
+
+    if "error" in result:
+        return f"Error: {result['error']}"
+
+    lines = []
+    for i, (command, command_result) in enumerate(zip(commands, result.get("results", [])), 1):
+        action = command.get("action", "unknown")
+        if "error" in command_result:
+            lines.append(f"  {i}. {action}: Error: {command_result['error']}")
+        else:
+            lines.append(f"  {i}. {action}: ok")
+
+    summary = f"Batch ran {result.get('count', 0)} of {len(commands)} commands ({result.get('errors', 0)} errors)"
+    return summary + ("\n" + "\n".join(lines) if lines else "")
+
+
 if __name__ == "__main__":
     mcp.run()